@@ -16,6 +16,9 @@ export default function Chat() {
     const [editingSessionId, setEditingSessionId] = useState(null);
     const [editTitle, setEditTitle] = useState('');
     const [model, setModel] = useState('gpt-4o-mini');
+    // Keyset cursors for the next (older) page, from the X-Next-Cursor response header
+    const [sessionsCursor, setSessionsCursor] = useState(null);
+    const [messagesCursor, setMessagesCursor] = useState(null);
 
     const inputRef = useRef(null);
 
@@ -32,16 +35,23 @@ export default function Chat() {
             setTimeout(() => inputRef.current?.focus(), 100);
         } else {
             setMessages([]);
+            setMessagesCursor(null);
         }
     }, [currentSessionId]);
 
-    const fetchSessions = async () => {
+    const fetchSessions = async (cursor = null) => {
         try {
             const token = localStorage.getItem('token');
-            const res = await fetch(`${API_BASE_URL}/sessions`, {
+            const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const res = await fetch(`${API_BASE_URL}/sessions${params}`, {
                 headers: { 'Authorization': `Bearer ${token} ` }
             });
             const data = await res.json();
+            setSessionsCursor(res.headers.get('X-Next-Cursor'));
+            if (cursor) {
+                setSessions(prev => [...prev, ...data]);
+                return;
+            }
             setSessions(data);
             if (data.length > 0 && !currentSessionId) {
                 setCurrentSessionId(data[0].id);
@@ -51,14 +61,18 @@ export default function Chat() {
         }
     };
 
-    const fetchMessages = async (sessionId) => {
+    // Newest page first (order=desc, reversed for display); older pages are prepended on demand
+    const fetchMessages = async (sessionId, cursor = null) => {
         try {
             const token = localStorage.getItem('token');
-            const res = await fetch(`${API_BASE_URL}/sessions/${sessionId}/messages`, {
+            const params = new URLSearchParams({ order: 'desc', fields: 'role,content,tokenCount' });
+            if (cursor) params.set('cursor', cursor);
+            const res = await fetch(`${API_BASE_URL}/sessions/${sessionId}/messages?${params}`, {
                 headers: { 'Authorization': `Bearer ${token}` }
             });
-            const data = await res.json();
-            setMessages(data);
+            const data = (await res.json()).reverse();
+            setMessagesCursor(res.headers.get('X-Next-Cursor'));
+            setMessages(prev => cursor ? [...data, ...prev] : data);
         } catch (error) {
             console.error('Error fetching messages:', error);
         }
@@ -151,7 +165,7 @@ export default function Chat() {
 
         try {
             const token = localStorage.getItem('token');
-            const res = await fetch(`${API_BASE_URL}/chat`, {
+            const res = await fetch(`${API_BASE_URL}/chat/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -169,18 +183,62 @@ export default function Chat() {
                 throw new Error(errData.detail || 'Failed to get response');
             }
 
-            const data = await res.json();
-            // Update the last user message with token count if backend sends it back (optional optimization)
-            // But we'll just append the assistant message which definitely has it.
-            // If we want to show user tokens immediately, we'd update the previous message.
-            setMessages(prev => {
-                const newMsgs = [...prev];
-                // Update user message token count if provided (assuming it is the last one)
-                if (data.user_tokens) {
-                    newMsgs[newMsgs.length - 1].tokenCount = data.user_tokens;
+            // Consume Server-Sent Events: "token" frames are appended to the assistant
+            // message as they arrive, "done" carries the final token counts.
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let started = false;
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                const frames = buffer.split('\n\n');
+                buffer = frames.pop();
+
+                for (const frame of frames) {
+                    let event = 'message';
+                    let dataLine = '';
+                    for (const line of frame.split('\n')) {
+                        if (line.startsWith('event: ')) event = line.slice(7);
+                        else if (line.startsWith('data: ')) dataLine += line.slice(6);
+                    }
+                    if (!dataLine) continue;
+                    const data = JSON.parse(dataLine);
+
+                    if (event === 'token') {
+                        if (!started) {
+                            started = true;
+                            setLoading(false);
+                            setMessages(prev => [...prev, { role: 'assistant', content: data.token }]);
+                        } else {
+                            setMessages(prev => {
+                                const newMsgs = [...prev];
+                                const last = newMsgs[newMsgs.length - 1];
+                                newMsgs[newMsgs.length - 1] = { ...last, content: last.content + data.token };
+                                return newMsgs;
+                            });
+                        }
+                    } else if (event === 'done') {
+                        setMessages(prev => {
+                            const newMsgs = [...prev];
+                            const aiIndex = started ? newMsgs.length - 1 : -1;
+                            const userIndex = started ? newMsgs.length - 2 : newMsgs.length - 1;
+                            if (data.user_tokens && newMsgs[userIndex]) {
+                                newMsgs[userIndex] = { ...newMsgs[userIndex], tokenCount: data.user_tokens };
+                            }
+                            if (aiIndex >= 0) {
+                                newMsgs[aiIndex] = { ...newMsgs[aiIndex], tokenCount: data.ai_tokens };
+                            }
+                            return newMsgs;
+                        });
+                    } else if (event === 'error') {
+                        throw new Error(data.detail || 'Failed to get response');
+                    }
                 }
-                return [...newMsgs, { role: 'assistant', content: data.response, tokenCount: data.ai_tokens }];
-            });
+            }
 
         } catch (error) {
             console.error(error);
@@ -259,6 +317,14 @@ export default function Chat() {
                             )}
                         </div>
                     ))}
+                    {sessionsCursor && (
+                        <button
+                            onClick={() => fetchSessions(sessionsCursor)}
+                            className="w-full text-center text-sm text-gray-400 hover:text-white py-2 cursor-pointer"
+                        >
+                            Load more
+                        </button>
+                    )}
                 </div>
 
                 <div className="p-4 border-t border-gray-700">
@@ -290,8 +356,19 @@ export default function Chat() {
                             <p>Start a new conversation!</p>
                         </div>
                     ) : (
-                        messages.map((msg, index) => (
-                            <div key={index} className={`flex flex-col ${msg.role === 'user' ? 'items-end' : 'items-start'}`}>
+                        <>
+                        {messagesCursor && (
+                            <div className="flex justify-center">
+                                <button
+                                    onClick={() => fetchMessages(currentSessionId, messagesCursor)}
+                                    className="text-sm text-indigo-600 hover:text-indigo-800 cursor-pointer"
+                                >
+                                    Load earlier messages
+                                </button>
+                            </div>
+                        )}
+                        {messages.map((msg, index) => (
+                            <div key={msg.id || index} className={`flex flex-col ${msg.role === 'user' ? 'items-end' : 'items-start'}`}>
                                 <div className={`max-w-2xl p-4 rounded-xl shadow-sm ${msg.role === 'user'
                                     ? 'bg-indigo-600 text-white rounded-br-none'
                                     : 'bg-white text-gray-800 rounded-bl-none border border-gray-100'
@@ -304,7 +381,8 @@ export default function Chat() {
                                     </span>
                                 )}
                             </div>
-                        ))
+                        ))}
+                        </>
                     )}
                     {loading && (
                         <div className="flex justify-start">
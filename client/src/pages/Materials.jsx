@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../AuthContext';
 
 
@@ -7,6 +7,9 @@ export default function Materials() {
     const [documents, setDocuments] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
+    // Keyset cursor of the next page (X-Next-Cursor); polling only refreshes the first page
+    const [nextCursor, setNextCursor] = useState(null);
+    const loadedMoreRef = useRef(false);
 
     const API_BASE_URL = window.location.hostname === 'localhost'
         ? 'http://localhost:8000'
@@ -27,16 +30,31 @@ export default function Materials() {
         }
     }, [documents]);
 
-    const fetchAllDocuments = async () => {
+    const fetchAllDocuments = async (cursor = null) => {
         try {
             setError(null);
             const token = localStorage.getItem('token');
-            const res = await fetch(`${API_BASE_URL}/documents/all`, {
+            const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            // Unchanged lists are revalidated with the ETag and answered with 304
+            const res = await fetch(`${API_BASE_URL}/documents/all${params}`, {
                 headers: { 'Authorization': `Bearer ${token}` }
             });
             if (res.ok) {
                 const data = await res.json();
-                setDocuments(data);
+                const next = res.headers.get('X-Next-Cursor');
+                if (cursor) {
+                    loadedMoreRef.current = true;
+                    setDocuments(prev => [...prev, ...data]);
+                    setNextCursor(next);
+                } else {
+                    // Refresh the first page and keep the older pages already loaded
+                    setDocuments(prev => {
+                        if (!next || data.length === 0) return data;
+                        const oldest = data[data.length - 1].createdAt;
+                        return [...data, ...prev.filter(d => d.createdAt < oldest)];
+                    });
+                    if (!loadedMoreRef.current) setNextCursor(next);
+                }
             } else {
                 setError(`Failed to fetch: ${res.status} ${res.statusText}`);
             }
@@ -147,30 +165,50 @@ export default function Materials() {
                                                             'bg-gray-100 text-gray-800'}`}>
                                                 {doc.status}
                                             </span>
+                                            {doc.status === 'analyzing' && doc.progress?.pages_total > 0 && (
+                                                <span className="ml-2 text-xs text-gray-500">
+                                                    {doc.progress.pages_done}/{doc.progress.pages_total} pages
+                                                </span>
+                                            )}
                                         </td>
                                         <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500 space-x-2">
-                                            <button
-                                                onClick={() => handleAnalyze(doc.id, doc.filename, doc.status)}
-                                                className={`px-3 py-1 rounded text-xs font-medium transition-colors shadow-sm cursor-pointer
-                                                    ${(doc.status === 'analyzing' || doc.status === 'completed')
-                                                        ? 'bg-gray-300 text-gray-500 cursor-not-allowed'
-                                                        : 'bg-indigo-600 text-white hover:bg-indigo-700'}`}
-                                                disabled={doc.status === 'analyzing' || doc.status === 'completed'}
-                                            >
-                                                {doc.status === 'completed' ? 'Done' : doc.status === 'analyzing' ? 'Processing' : 'Analyze'}
-                                            </button>
-                                            <button
-                                                onClick={() => handleDelete(doc.id, doc.filename)}
-                                                className="px-3 py-1 bg-white border border-gray-300 text-red-600 rounded hover:bg-gray-50 text-xs font-medium transition-colors shadow-sm cursor-pointer"
-                                            >
-                                                Delete
-                                            </button>
+                                            {/* Analyze and Delete act on the caller's own documents only */}
+                                            {doc.userId === user?.id && (
+                                                <>
+                                                    <button
+                                                        onClick={() => handleAnalyze(doc.id, doc.filename, doc.status)}
+                                                        className={`px-3 py-1 rounded text-xs font-medium transition-colors shadow-sm cursor-pointer
+                                                            ${(doc.status === 'analyzing' || doc.status === 'completed')
+                                                                ? 'bg-gray-300 text-gray-500 cursor-not-allowed'
+                                                                : 'bg-indigo-600 text-white hover:bg-indigo-700'}`}
+                                                        disabled={doc.status === 'analyzing' || doc.status === 'completed'}
+                                                    >
+                                                        {doc.status === 'completed' ? 'Done' : doc.status === 'analyzing' ? 'Processing' : 'Analyze'}
+                                                    </button>
+                                                    <button
+                                                        onClick={() => handleDelete(doc.id, doc.filename)}
+                                                        className="px-3 py-1 bg-white border border-gray-300 text-red-600 rounded hover:bg-gray-50 text-xs font-medium transition-colors shadow-sm cursor-pointer"
+                                                    >
+                                                        Delete
+                                                    </button>
+                                                </>
+                                            )}
                                         </td>
                                     </tr>
                                 ))}
                             </tbody>
                         </table>
                     )}
+                    {nextCursor && (
+                        <div className="px-6 py-3 text-center border-t border-gray-200">
+                            <button
+                                onClick={() => fetchAllDocuments(nextCursor)}
+                                className="text-sm text-indigo-600 hover:text-indigo-800 font-medium cursor-pointer"
+                            >
+                                Load more
+                            </button>
+                        </div>
+                    )}
                 </div>
             </div>
         </div>
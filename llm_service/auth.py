@@ -0,0 +1,102 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import jwt
+
+# Request authentication without repeated work:
+#
+# - TokenCache: decoded JWT payloads in a bounded LRU keyed by the token's SHA-256 (raw
+#   tokens are never kept). An entry lives until the token's `exp` (or max_age_seconds
+#   for tokens without one), so an expired token is rejected from the cache exactly as
+#   jwt.decode would reject it. Invalid tokens are never cached.
+# - OwnershipCache: short-TTL record of (user_id, session_id) pairs already checked
+#   against ChatSession, so chat turns and message reads don't repeat the lookup.
+#   Deletes invalidate locally; other processes see a deleted session for at most
+#   ttl_seconds, and the reads themselves are scoped by session, so nothing leaks.
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+class TokenCache:
+    def __init__(self, secret: str, algorithms: list, max_entries: int = 10000, max_age_seconds: int = 300):
+        self.secret = secret
+        self.algorithms = algorithms
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, token: str) -> dict:
+        """jwt.decode with an LRU in front; raises the same jwt exceptions."""
+        if self.max_entries <= 0:
+            return jwt.decode(token, self.secret, algorithms=self.algorithms)
+
+        key = token_key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                del self._entries[key]
+
+        # Miss (or expired entry): full verification, which also raises ExpiredSignatureError
+        payload = jwt.decode(token, self.secret, algorithms=self.algorithms)
+        self.misses += 1
+        exp = payload.get("exp")
+        expires_at = float(exp) if exp is not None else now + self.max_age_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+class OwnershipCache:
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def owns(self, user_id: str, session_id: str) -> bool:
+        # True if recently confirmed; False means "unknown", not "not owned"
+        key = (user_id, session_id)
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > time.monotonic():
+                self.hits += 1
+                return True
+            if expires_at is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False
+
+    def remember(self, user_id: str, session_id: str):
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[(user_id, session_id)] = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end((user_id, session_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id: str, session_ids):
+        with self._lock:
+            for session_id in session_ids:
+                self._entries.pop((user_id, session_id), None)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,91 @@
+import sys
+import time
+import uuid
+import asyncio
+import datetime
+
+import jwt
+import httpx
+from fastapi import FastAPI, Header, Depends, HTTPException
+
+from auth import TokenCache
+
+# GET /sessions req/s with the old auth dependency (sync jwt.decode in the threadpool)
+# next to auth.TokenCache, in-process over ASGI; the DB is a sleep of db_latency_ms.
+# python bench_auth.py [requests] [concurrency] [db_latency_ms]
+
+SECRET = "bench-secret-bench-secret-bench-secret"
+SESSIONS = [{"id": str(uuid.uuid4()), "title": f"Chat {i}", "createdAt": "2024-01-01T00:00:00"} for i in range(20)]
+
+def build_app(db_latency: float) -> FastAPI:
+    app = FastAPI()
+    token_cache = TokenCache(SECRET, ["HS256"])
+
+    def verify_token_before(authorization: str = Header(None)):
+        if not authorization:
+            raise HTTPException(status_code=401)
+        try:
+            return jwt.decode(authorization.split(" ")[1], SECRET, algorithms=["HS256"])
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401)
+
+    async def verify_token_after(authorization: str = Header(None)):
+        if not authorization:
+            raise HTTPException(status_code=401)
+        try:
+            return token_cache.decode(authorization.split(" ")[1])
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401)
+
+    async def list_sessions():
+        if db_latency:
+            await asyncio.sleep(db_latency)
+        return SESSIONS
+
+    @app.get("/before/sessions")
+    async def sessions_before(user: dict = Depends(verify_token_before)):
+        return await list_sessions()
+
+    @app.get("/after/sessions")
+    async def sessions_after(user: dict = Depends(verify_token_after)):
+        return await list_sessions()
+
+    app.state.token_cache = token_cache
+    return app
+
+async def measure(client, path: str, headers: dict, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            resp = await client.get(path, headers=headers)
+            assert resp.status_code == 200, resp.status_code
+
+    await one()  # warm-up (and the one cache miss)
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - started)
+
+async def bench(total: int, concurrency: int, db_latency_ms: float):
+    app = build_app(db_latency_ms / 1000)
+    token = jwt.encode({
+        "id": str(uuid.uuid4()),
+        "email": "bench@example.com",
+        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+    }, SECRET, algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    print(f"{total} requests, concurrency {concurrency}, simulated DB latency {db_latency_ms} ms")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name, path in (("before (sync jwt.decode)", "/before/sessions"), ("after (cached, async)", "/after/sessions")):
+            rps = await measure(client, path, headers, total, concurrency)
+            print(f"  {name:<26} {rps:8.1f} req/s")
+    print(f"  token cache: {app.state.token_cache.stats()}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(bench(
+        int(args[0]) if len(args) > 0 else 5000,
+        int(args[1]) if len(args) > 1 else 32,
+        float(args[2]) if len(args) > 2 else 0.0,
+    ))
@@ -0,0 +1,46 @@
+import sys
+import time
+import asyncio
+
+import fitz  # PyMuPDF
+
+from ingestion import extract_page_range, extract_pdf_pages, render_markdown
+
+# PDF ingestion throughput with simulated vision latency: the old page-by-page loop
+# against the concurrent pipeline.
+# python bench_ingestion.py sample.pdf [simulated_vision_seconds]
+
+async def fake_describe_image(image_bytes, latency):
+    await asyncio.sleep(latency)
+    return f"| simulated | {len(image_bytes)} bytes |"
+
+async def sequential(pdf_path, latency):
+    doc = fitz.open(pdf_path)
+    page_count = doc.page_count
+    doc.close()
+    pages = extract_page_range(pdf_path, 0, page_count)
+    for items in pages:
+        for item in items:
+            if item[0] == "image":
+                await fake_describe_image(item[1], latency)
+    return pages
+
+async def concurrent(pdf_path, latency):
+    pages = await extract_pdf_pages(pdf_path)
+    await render_markdown(pages, lambda image_bytes: fake_describe_image(image_bytes, latency))
+    return pages
+
+async def bench(pdf_path, latency):
+    for name, fn in (("before (sequential)", sequential), ("after (concurrent)", concurrent)):
+        start = time.perf_counter()
+        pages = await fn(pdf_path, latency)
+        elapsed = time.perf_counter() - start
+        images = sum(1 for items in pages for item in items if item[0] == "image")
+        print(f"{name:<20} {len(pages)} pages, {images} images in {elapsed:.2f}s "
+              f"-> {len(pages) / elapsed:.2f} pages/s")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python bench_ingestion.py sample.pdf [simulated_vision_seconds]")
+        sys.exit(1)
+    asyncio.run(bench(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 1.5))
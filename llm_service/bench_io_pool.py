@@ -0,0 +1,60 @@
+import sys
+import time
+import threading
+
+import requests
+import uvicorn
+from fastapi import FastAPI
+
+from io_pool import run_blocking
+from load_test import CONCURRENCY_LEVELS, run_level
+
+# p50/p95/p99 per concurrency level for a sync SDK call made on the event loop versus
+# awaited through io_pool.run_blocking (uvicorn on localhost, time.sleep as the call).
+# python bench_io_pool.py [requests_per_level] [db_latency_ms]
+
+PORT = 8765
+
+def build_app(db_latency: float) -> FastAPI:
+    app = FastAPI()
+
+    def query():
+        time.sleep(db_latency)
+        return [{"id": str(i), "title": f"Chat {i}"} for i in range(20)]
+
+    @app.get("/before/sessions")
+    async def sessions_before():
+        return query()
+
+    @app.get("/after/sessions")
+    async def sessions_after():
+        return await run_blocking(query)
+
+    return app
+
+def bench(total: int, db_latency_ms: float):
+    server = uvicorn.Server(uvicorn.Config(build_app(db_latency_ms / 1000), port=PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(CONCURRENCY_LEVELS))
+    session.mount("http://", adapter)
+
+    print(f"{total} requests per level, simulated DB latency {db_latency_ms} ms")
+    for name in ("before", "after"):
+        print(f"{name}:")
+        for concurrency in CONCURRENCY_LEVELS:
+            run_level(session, f"http://127.0.0.1:{PORT}/{name}/sessions", {}, concurrency, total)
+
+    server.should_exit = True
+    thread.join()
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    bench(
+        int(args[0]) if len(args) > 0 else 200,
+        float(args[1]) if len(args) > 1 else 20.0,
+    )
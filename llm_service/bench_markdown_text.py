@@ -0,0 +1,88 @@
+import sys
+import time
+import tracemalloc
+
+from markdown_text import iter_blocks
+
+# markdown + BeautifulSoup against markdown_text.iter_blocks on synthetic pages
+# shaped like extraction output.
+# python bench_markdown_text.py [pages]
+
+def synthetic_page(n: int) -> str:
+    rows = "\n".join(f"| Item {n}-{r} | {r * 17} | **{r * 3}%** | note with `code` and [link](http://x/{r}) |"
+                     for r in range(12))
+    paragraph = ("Quarterly revenue grew *steadily* across regions, while __operating costs__ "
+                 "remained flat. See the appendix for the full breakdown &amp; methodology. ") * 6
+    return f"""# Section {n}
+
+## Overview {n}
+
+{paragraph}
+
+- First point on page {n}
+- Second point with **bold** text
+  - Nested detail
+
+| Name | Units | Share | Comment |
+| --- | ---: | :---: | --- |
+{rows}
+
+> **Image Analysis**:
+> | Quarter | Value |
+> | --- | --- |
+> | Q1 | 10 |
+> | Q2 | 12 |
+
+{paragraph}
+"""
+
+def old_converter(page_markdown: str) -> str:
+    import markdown
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(markdown.markdown(page_markdown), "html.parser").get_text()
+
+def blocks_text(page_markdown: str) -> str:
+    out = []
+    for kind, payload in iter_blocks(page_markdown.splitlines()):
+        if kind == "heading":
+            out.append(payload[1])
+        elif kind == "table":
+            out.extend(payload)
+        else:
+            out.append(payload)
+    return "\n".join(out)
+
+def measure(name, fn, pages):
+    # Timed without tracemalloc (it slows allocation-heavy code unevenly), then traced for peak memory
+    started = time.perf_counter()
+    texts = [fn(page) for page in pages]
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    for page in pages:
+        fn(page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28} {elapsed:7.2f}s  {len(pages) / elapsed:8.1f} pages/s  peak {peak / 1e6:6.1f} MB")
+    return texts
+
+def table_sample(text: str) -> str:
+    lines = text.splitlines()
+    start = next((i for i, line in enumerate(lines) if "Item 0-0" in line), 0)
+    return "\n".join(lines[max(0, start - 1):start + 3])
+
+def bench(page_count: int):
+    pages = [synthetic_page(n) for n in range(page_count)]
+    print(f"{page_count} pages, {sum(map(len, pages)) / 1e6:.1f} MB of Markdown")
+    try:
+        old = measure("markdown + BeautifulSoup", old_converter, pages)
+    except ImportError:
+        old = None
+        print("markdown + BeautifulSoup     skipped (pip install markdown beautifulsoup4)")
+    new = measure("markdown_text.iter_blocks", blocks_text, pages)
+
+    if old:
+        print("\nTable rows, old:\n" + table_sample(old[0]))
+    print("\nTable rows, new:\n" + table_sample(new[0]))
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
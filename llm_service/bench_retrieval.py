@@ -0,0 +1,128 @@
+import sys
+import time
+import random
+import asyncio
+import hashlib
+import tempfile
+
+import numpy as np
+
+from vector_store import LocalVectorStore
+from keyword_index import KeywordIndex
+from retrieval import Retriever, RetrievalOptions, LexicalReranker
+
+# recall@k and latency of dense / keyword / hybrid retrieval (+rerank, +MMR) on a seeded
+# synthetic tax-table corpus. Dense uses an offline hashing embedder unless --openai.
+# python bench_retrieval.py [documents] [--openai]
+
+REGIONS = ["서울", "부산", "대구", "인천", "광주", "대전", "울산", "세종"]
+LABELS = ["1억원 이하", "1억원 초과 5억원 이하", "5억원 초과 10억원 이하", "10억원 초과"]
+PROSE = ("The committee reviewed the quarterly filing and noted that deductions for "
+         "research expenses were applied consistently across subsidiaries. ")
+
+class HashEmbeddings:
+    """Offline stand-in for OpenAIEmbeddings: hashed character trigrams, L2-normalized."""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _embed(self, text: str):
+        v = np.zeros(self.dim, dtype=np.float32)
+        text = f"  {text.lower()}  "
+        for i in range(len(text) - 2):
+            h = int.from_bytes(hashlib.blake2b(text[i:i + 3].encode("utf-8"), digest_size=4).digest(), "little")
+            v[h % self.dim] += 1.0
+        return (v / (np.linalg.norm(v) or 1.0)).tolist()
+
+    async def aembed_query(self, text: str):
+        return self._embed(text)
+
+    async def aembed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+def build_corpus(documents: int, rng: random.Random):
+    # -> {doc_id: [chunk text]}, [(query, target chunk text)]
+    corpus = {}
+    queries = []
+    for d in range(documents):
+        doc_id = f"doc{d:03d}"
+        chunks = []
+        for t in range(6):
+            region = REGIONS[(d + t) % len(REGIONS)]
+            rows = []
+            for r, label in enumerate(LABELS):
+                code = f"TX-{d:03d}{t}{r}"
+                rate = rng.choice([6, 15, 24, 35, 38, 40, 42, 45])
+                rows.append((code, label, rate))
+            table = "\n".join([f"과세표준 | 세율 | 코드 ({region} {d}년 개정)"] +
+                              [f"{label} | {rate}% | {code}" for code, label, rate in rows])
+            chunks.append(table)
+            code, label, rate = rng.choice(rows)
+            queries.append((f"{code} 항목 세율이 얼마야?", table))
+            queries.append((f"{region} {d}년 개정 {label} 구간 세율", table))
+        for p in range(4):
+            chunks.append(f"Section {d}.{p}: " + PROSE * 3)
+        corpus[doc_id] = chunks
+    rng.shuffle(queries)
+    return corpus, queries[:200]
+
+async def index_corpus(corpus, embeddings, store, keyword_index):
+    started = time.perf_counter()
+    for doc_id, texts in corpus.items():
+        vectors = await embeddings.aembed_documents(texts)
+        metadatas = [{"doc_id": doc_id, "filename": f"{doc_id}.pdf", "text": text} for text in texts]
+        store.upsert([
+            {"id": f"{doc_id}#{i}", "values": vector, "metadata": metadata}
+            for i, (vector, metadata) in enumerate(zip(vectors, metadatas))
+        ])
+        keyword_index.index_document(doc_id, texts, metadatas)
+    return time.perf_counter() - started
+
+async def run(retriever, queries, options):
+    latencies = []
+    hits = 0
+    for query, target in queries:
+        started = time.perf_counter()
+        result = await retriever.search(query, options)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += any(doc.page_content == target for doc in result.docs)
+    latencies.sort()
+    return {
+        "recall": hits / len(queries),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+async def bench(documents: int, use_openai: bool):
+    if use_openai:
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+    else:
+        embeddings = HashEmbeddings()
+
+    corpus, queries = build_corpus(documents, random.Random(7))
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LocalVectorStore(f"{tmp}/vectors")
+        keyword_index = KeywordIndex(f"{tmp}/keywords.sqlite3")
+        seconds = await index_corpus(corpus, embeddings, store, keyword_index)
+        chunks = sum(map(len, corpus.values()))
+        print(f"{documents} documents, {chunks} chunks indexed in {seconds:.1f}s; {len(queries)} queries, "
+              f"{'OpenAI' if use_openai else 'hashing'} embeddings\n")
+
+        retriever = Retriever(store, embeddings, keyword_index, LexicalReranker())
+        configs = [
+            ("dense (k=4)", RetrievalOptions(mode="dense", rerank=False, mmr=False)),
+            ("keyword (k=4)", RetrievalOptions(mode="keyword", rerank=False, mmr=False)),
+            ("hybrid RRF", RetrievalOptions(mode="hybrid", rerank=False, mmr=False)),
+            ("hybrid RRF + MMR", RetrievalOptions(mode="hybrid", rerank=False, mmr=True)),
+            ("hybrid RRF + rerank", RetrievalOptions(mode="hybrid", rerank=True, mmr=False)),
+            ("hybrid RRF + rerank + MMR", RetrievalOptions(mode="hybrid", rerank=True, mmr=True)),
+        ]
+        print(f"{'config':<28} {'recall@4':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, options in configs:
+            stats = await run(retriever, queries, options)
+            print(f"{name:<28} {stats['recall']:8.2f} {stats['p50']:8.1f} {stats['p95']:8.1f}")
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    asyncio.run(bench(int(args[0]) if args else 50, "--openai" in sys.argv))
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import subprocess
+
+from tokens import count_tokens, count_tokens_batch, heuristic_count, get_encoding
+
+# len(text) // 4 against o200k_base counts on English, Korean and mixed text, plus
+# encoder load time and throughput.
+# python bench_tokens.py
+
+SAMPLES = {
+    "english": (
+        "Use the following pieces of context to answer the user's question. "
+        "If the information is not in the context, just say that you don't know. "
+        "The fee schedule applies to all transactions settled after the first business day of the quarter."
+    ),
+    "korean": (
+        "거래금액이 10억원 초과인 경우 수수료율은 0.15%이며, 5억원 이하 구간은 별도의 감면 규정이 적용됩니다. "
+        "표의 마지막 행까지 모든 값을 빠짐없이 전사해야 하며, 셀 안의 여러 줄은 하나의 셀로 유지합니다."
+    ),
+    "mixed": (
+        "| 구간 | Fee rate | 비고 |\n|---|---|---|\n| 1억원 이하 | 0.50% | 기본 요율 |\n"
+        "| 10억원 초과 | 0.15% | VIP discount applies |\n"
+        "Q: 10억원 초과 거래의 fee table은 어떻게 되나요? A: See section 3.2 of the 2024 report."
+    ),
+}
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def accuracy_report():
+    print("Accuracy (heuristic vs o200k_base):")
+    for name, text in SAMPLES.items():
+        exact = count_tokens(text)
+        approx = heuristic_count(text)
+        error = (approx - exact) / exact * 100 if exact else 0.0
+        print(f"  {name:<8} chars={len(text):<5} bpe={exact:<5} heuristic={approx:<5} error={error:+6.1f}%")
+
+LOAD_SNIPPET = """
+import time
+from tokens import get_encoding
+start = time.perf_counter()
+get_encoding()
+print((time.perf_counter() - start) * 1000)
+"""
+
+def encoder_load_ms() -> float:
+    # Timed in a fresh interpreter: this process already holds the cached encoder
+    out = subprocess.run([sys.executable, "-c", LOAD_SNIPPET], cwd=os.path.dirname(os.path.abspath(__file__)),
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+def micro_benchmark():
+    print(f"\nEncoder load (first call, fresh process): {encoder_load_ms():.1f}ms")
+
+    corpus = [text for text in SAMPLES.values()] * 500
+    print(f"Throughput on {len(corpus)} strings:")
+    heuristic_us = timed(lambda: [heuristic_count(t) for t in corpus], 5)
+    single_us = timed(lambda: [count_tokens(t) for t in corpus], 5)
+    batch_us = timed(lambda: count_tokens_batch(corpus), 5)
+    print(f"  heuristic          {heuristic_us / 1000:8.2f}ms")
+    print(f"  count_tokens loop  {single_us / 1000:8.2f}ms")
+    print(f"  count_tokens_batch {batch_us / 1000:8.2f}ms")
+
+if __name__ == "__main__":
+    if get_encoding() is None:
+        print("tiktoken encoder unavailable (not installed or BPE file not cached); only the heuristic can run.")
+    else:
+        accuracy_report()
+        micro_benchmark()
@@ -0,0 +1,144 @@
+import os
+import re
+from dataclasses import dataclass
+
+from markdown_text import iter_blocks
+
+# Structure-aware chunking of the per-page Markdown produced by extraction. One pass over
+# the pages: lines are grouped into blocks (heading, paragraph, table, code), converted to
+# plain text, and packed into chunks of at most CHUNK_MAX_TOKENS tokens. Headings and
+# page ends close a chunk, a tail shorter than CHUNK_MIN_TOKENS is folded into the chunk
+# before it (same section and page), tables are only split between rows (the header row
+# is repeated in each piece), and every chunk records its page span and section path
+# ("Report > Results > Revenue").
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "80"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?。])\s+")
+
+@dataclass
+class Chunk:
+    text: str
+    page: int
+    page_end: int
+    section: str
+    tokens: int
+
+class Chunker:
+    def __init__(self, count_tokens, max_tokens: int = CHUNK_MAX_TOKENS, min_tokens: int = CHUNK_MIN_TOKENS):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+
+    def _pack(self, pieces, joiner: str, prefix: str = None):
+        # Greedily packs (text, tokens) pieces into groups under the budget; `prefix`
+        # (a table header) starts every group
+        prefix_tokens = self.count_tokens(prefix) if prefix else 0
+        group, group_tokens = [], prefix_tokens
+        for text, tokens in pieces:
+            if group and group_tokens + tokens > self.max_tokens:
+                yield joiner.join(([prefix] if prefix else []) + group), group_tokens
+                group, group_tokens = [], prefix_tokens
+            group.append(text)
+            group_tokens += tokens
+        if group:
+            yield joiner.join(([prefix] if prefix else []) + group), group_tokens
+
+    def _split_text(self, text: str, tokens: int):
+        # Oversized paragraph: split on lines, then sentences, then words
+        if tokens <= self.max_tokens:
+            yield text, tokens
+            return
+        for separator, joiner in (("\n", "\n"), (_SENTENCE_END, " "), (" ", " ")):
+            parts = _SENTENCE_END.split(text) if separator is _SENTENCE_END else text.split(separator)
+            if len(parts) > 1:
+                pieces = []
+                for part in parts:
+                    if part.strip():
+                        pieces.extend(self._split_text(part, self.count_tokens(part)))
+                yield from self._pack(pieces, joiner)
+                return
+        # A single unbreakable run (no whitespace): cut by characters
+        step = max(1, len(text) * self.max_tokens // tokens)
+        for i in range(0, len(text), step):
+            piece = text[i:i + step]
+            yield piece, self.count_tokens(piece)
+
+    def _block_pieces(self, kind: str, payload):
+        if kind == "table":
+            rows = [(row, self.count_tokens(row)) for row in payload]
+            if sum(tokens for _, tokens in rows) <= self.max_tokens:
+                yield "\n".join(payload), sum(tokens for _, tokens in rows)
+            else:
+                header, body = rows[0], rows[1:]
+                yield from self._pack(body, "\n", prefix=header[0])
+        else:
+            yield from self._split_text(payload, self.count_tokens(payload))
+
+    def iter_chunks(self, pages):
+        """Yields Chunks for an iterable of per-page Markdown strings (pages numbered from 1)."""
+        path = []  # [(level, title)] of the enclosing headings
+        parts, tokens = [], 0
+        only_headings = True
+        page_start = page_end = 0
+        section = ""
+        held = None  # last finished chunk, kept back so a tiny tail can be folded into it
+
+        def flush():
+            nonlocal parts, tokens, only_headings, held
+            if not parts:
+                return None
+            chunk = Chunk("\n\n".join(parts), page_start, page_end, section, tokens)
+            parts, tokens, only_headings = [], 0, True
+            if held and chunk.tokens < self.min_tokens and held.section == chunk.section \
+                    and held.page_end == chunk.page and held.tokens + chunk.tokens <= self.max_tokens + self.min_tokens:
+                held = Chunk(held.text + "\n\n" + chunk.text, held.page, chunk.page_end, held.section,
+                             held.tokens + chunk.tokens)
+                return None
+            ready, held = held, chunk
+            return ready
+
+        for page_num, page_markdown in enumerate(pages, start=1):
+            for kind, payload in iter_blocks(page_markdown.splitlines()):
+                if kind == "heading":
+                    level, title = payload
+                    # A heading starts a new chunk; consecutive headings stay together
+                    if not only_headings:
+                        ready = flush()
+                        if ready:
+                            yield ready
+                    path = [entry for entry in path if entry[0] < level] + [(level, title)]
+                    pieces = [(title, self.count_tokens(title))]
+                else:
+                    pieces = self._block_pieces(kind, payload)
+
+                for text, piece_tokens in pieces:
+                    if parts and tokens + piece_tokens > self.max_tokens:
+                        ready = flush()
+                        if ready:
+                            yield ready
+                    if not parts:
+                        page_start = page_num
+                    # Section path as of the chunk's first non-heading content
+                    if only_headings:
+                        section = " > ".join(title for _, title in path)
+                    parts.append(text)
+                    tokens += piece_tokens
+                    page_end = page_num
+                    if kind != "heading":
+                        only_headings = False
+
+            # Pages are chunk boundaries, so re-analysing an edited page only touches its chunks
+            ready = flush()
+            if ready:
+                yield ready
+
+        ready = flush()
+        if ready:
+            yield ready
+        if held:
+            yield held
+
+    def chunk_pages(self, pages) -> list:
+        return list(self.iter_chunks(pages))
@@ -0,0 +1,155 @@
+import logging
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from io_pool import run_blocking
+
+logger = logging.getLogger("llm_service.embedding_cache")
+
+def normalize_query(text: str) -> str:
+    # Unicode-normalize, collapse whitespace and casefold so trivially different
+    # spellings of the same question share one cache entry
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split()).casefold()
+
+class MemoryEmbeddingStore:
+    """Bounded in-process LRU with per-entry TTL. Vectors are kept as float32 arrays."""
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: int = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, vector = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return vector
+
+    def set(self, key: str, vector):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisEmbeddingStore:
+    """Shared second tier backed by any client with the redis-py get/set API.
+
+    Vectors are stored as raw float32 bytes with a server-side TTL, so a local
+    stand-in (e.g. fakeredis) can replace a real Redis in development.
+    """
+
+    def __init__(self, client, ttl_seconds: int = 86400, prefix: str = "emb:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key: str):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return np.frombuffer(raw, dtype=np.float32)
+
+    def set(self, key: str, vector):
+        self.client.set(self.prefix + key, vector.tobytes(), ex=self.ttl_seconds)
+
+class CachedEmbeddings(Embeddings):
+    """Query-embedding cache in front of an Embeddings model.
+
+    Only embed_query/aembed_query are cached (chat questions repeat, document
+    chunks do not); embed_documents passes straight through.
+    """
+
+    def __init__(self, embeddings: Embeddings, store: MemoryEmbeddingStore, shared_store=None):
+        self.embeddings = embeddings
+        self.store = store
+        self.shared_store = shared_store
+        self.model = getattr(embeddings, "model", "")
+        self.hits = 0
+        self.misses = 0
+
+    def cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str):
+        vector = self.store.get(key)
+        if vector is None and self.shared_store is not None:
+            try:
+                vector = self.shared_store.get(key)
+            except Exception as e:
+                logger.warning("Embedding cache backend read failed", extra={"error": str(e)})
+            if vector is not None:
+                self.store.set(key, vector)
+        return vector
+
+    def _remember(self, key: str, embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        self.store.set(key, vector)
+        if self.shared_store is not None:
+            try:
+                self.shared_store.set(key, vector)
+            except Exception as e:
+                logger.warning("Embedding cache backend write failed", extra={"error": str(e)})
+
+    def embed_query(self, text: str):
+        key = self.cache_key(text)
+        vector = self._lookup(key)
+        if vector is not None:
+            self.hits += 1
+            return vector.tolist()
+        self.misses += 1
+        embedding = self.embeddings.embed_query(text)
+        self._remember(key, embedding)
+        return embedding
+
+    async def aembed_query(self, text: str):
+        key = self.cache_key(text)
+        # The shared backend is a blocking client, so only the memory tier is read inline
+        vector = await run_blocking(self._lookup, key) if self.shared_store is not None else self.store.get(key)
+        if vector is not None:
+            self.hits += 1
+            return vector.tolist()
+        self.misses += 1
+        embedding = await self.embeddings.aembed_query(text)
+        if self.shared_store is not None:
+            await run_blocking(self._remember, key, embedding)
+        else:
+            self._remember(key, embedding)
+        return embedding
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return await self.embeddings.aembed_documents(texts)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.store),
+            "max_entries": self.store.max_entries,
+            "evictions": self.store.evictions,
+            "shared_backend": self.shared_store is not None,
+        }
@@ -0,0 +1,155 @@
+import logging
+import time
+import asyncio
+import datetime
+from dataclasses import dataclass, field
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from io_pool import execute
+from metrics import stage
+
+logger = logging.getLogger("llm_service.history")
+
+def _timestamp(value: str) -> datetime.datetime:
+    # PostgREST timestamps vary in fractional digits, so compare parsed values, not strings
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant.
+Merge the new messages into the existing summary. Keep facts, names, numbers and open questions
+the assistant may need later. Answer with the updated summary only, at most 200 words.
+
+Existing summary:
+{summary}
+
+New messages:
+{transcript}
+"""
+
+@dataclass
+class HistoryWindow:
+    messages: list
+    summary: str = None
+    has_older: bool = False
+    oldest_created_at: str = None
+    tokens: int = 0
+    timings: dict = field(default_factory=dict)
+
+class HistoryManager:
+    """Bounded per-session chat history.
+
+    Each turn fetches only the newest `max_messages` rows (LIMIT query) and keeps
+    as many of them as fit in `token_budget`, using the stored tokenCount column.
+    With summaries enabled, turns that fall out of the window are folded into a
+    running summary stored on the session (ChatSession.summary /
+    ChatSession.summarizedUntil), so per-turn cost stays flat for long sessions.
+    """
+
+    def __init__(self, supabase, count_tokens, token_budget: int = 4000, max_messages: int = 40,
+                 summary_llm=None):
+        self.supabase = supabase
+        self.count_tokens = count_tokens
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+        self.summary_llm = summary_llm
+
+    def _tokens(self, row) -> int:
+        if row.get("tokenCount") is not None:
+            return row["tokenCount"]
+        return self.count_tokens(row.get("content") or "")
+
+    async def _fetch_tail(self, session_id: str):
+        res = await execute(self.supabase.table("ChatMessage").select("role, content, tokenCount, createdAt")\
+            .eq("sessionId", session_id)\
+            .order("createdAt", desc=True)\
+            .limit(self.max_messages))
+        return res.data or []
+
+    async def _fetch_summary(self, session_id: str):
+        # -> (summary, summarizedUntil), both None without a summary
+        if not self.summary_llm:
+            return None, None
+        try:
+            res = await execute(self.supabase.table("ChatSession").select("summary, summarizedUntil")\
+                .eq("id", session_id))
+            if not res.data:
+                return None, None
+            return res.data[0].get("summary"), res.data[0].get("summarizedUntil")
+        except Exception as e:
+            logger.warning("History summary fetch failed (continuing without summary)", extra={"error": str(e)})
+            return None, None
+
+    async def load(self, session_id: str) -> HistoryWindow:
+        start = time.perf_counter()
+        with stage("chat", "history"):
+            rows, (summary, summarized_until) = await asyncio.gather(
+                self._fetch_tail(session_id), self._fetch_summary(session_id)
+            )
+
+        # The window starts strictly after the summary, so a message is never sent twice
+        # (once folded into the summary, once verbatim) when the window grows back
+        summarized_all = False
+        if summary and summarized_until:
+            cutoff = _timestamp(summarized_until)
+            unsummarized = [row for row in rows if _timestamp(row["createdAt"]) > cutoff]
+            summarized_all = len(unsummarized) < len(rows)
+            rows = unsummarized
+
+        # Walk newest -> oldest until the budget is spent
+        kept = []
+        used = 0
+        for row in rows:
+            tokens = self._tokens(row)
+            if used + tokens > self.token_budget:
+                break
+            kept.append(row)
+            used += tokens
+        kept.reverse()
+
+        # Older messages not yet in the summary: dropped by the budget, or possibly beyond
+        # the LIMIT (unless the fetch already reached summarized rows)
+        has_older = len(kept) < len(rows) or (len(rows) == self.max_messages and not summarized_all)
+        return HistoryWindow(
+            messages=kept,
+            summary=summary,
+            has_older=has_older,
+            oldest_created_at=kept[0]["createdAt"] if kept else None,
+            tokens=used,
+            timings={"history_ms": (time.perf_counter() - start) * 1000},
+        )
+
+    async def update_summary(self, session_id: str, window: HistoryWindow):
+        # Fold turns that fell out of the window into the stored running summary
+        if not self.summary_llm or not window.has_older or not window.oldest_created_at:
+            return
+        try:
+            session_res = await execute(self.supabase.table("ChatSession").select("summary, summarizedUntil")\
+                .eq("id", session_id))
+            if not session_res.data:
+                return
+            session = session_res.data[0]
+
+            query = self.supabase.table("ChatMessage").select("role, content, createdAt")\
+                .eq("sessionId", session_id)\
+                .lt("createdAt", window.oldest_created_at)
+            if session.get("summarizedUntil"):
+                query = query.gt("createdAt", session["summarizedUntil"])
+            pending = (await execute(query.order("createdAt", desc=False).limit(self.max_messages))).data
+            if not pending:
+                return
+
+            transcript = "\n".join(f"{m['role']}: {m['content']}" for m in pending)
+            response = await self.summary_llm.ainvoke([
+                SystemMessage(content="You summarize conversations."),
+                HumanMessage(content=SUMMARY_PROMPT.format(
+                    summary=session.get("summary") or "(none)",
+                    transcript=transcript
+                ))
+            ])
+            await execute(self.supabase.table("ChatSession").update({
+                "summary": response.content,
+                "summarizedUntil": pending[-1]["createdAt"]
+            }).eq("id", session_id))
+            logger.info("Folded messages into session summary", extra={"session_id": session_id, "messages": len(pending)})
+        except Exception as e:
+            logger.warning("History summary update failed", extra={"session_id": session_id, "error": str(e)})
@@ -0,0 +1,240 @@
+import logging
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+from contextlib import contextmanager
+
+from io_pool import run_blocking
+from tokens import count_tokens_batch
+from metrics import stage
+
+logger = logging.getLogger("llm_service.indexing")
+
+# Embedding requests are capped well under OpenAI's 300k tokens/request limit, and
+# upserts stay under Pinecone's 2MB request limit (a 3072-dim vector is ~30KB as JSON)
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "50000"))
+EMBED_BATCH_MAX_ITEMS = int(os.getenv("EMBED_BATCH_MAX_ITEMS", "512"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "40"))
+UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "4"))
+DELETE_BATCH_SIZE = 1000  # Pinecone's per-request limit for delete by ID
+
+# Where a chunk sits in the document. Kept out of the content hash so inserting a page
+# doesn't re-embed every later chunk; the manifest records it and moved chunks only get
+# their stored metadata updated
+POSITION_FIELDS = ("page", "page_end", "chunk_index")
+
+def content_hash(text: str, metadata: dict) -> str:
+    # Covers the rest of the metadata too, so a renamed file or a chunk under another
+    # section is rewritten even if its text is unchanged
+    meta = {k: v for k, v in metadata.items() if k not in ("text", "content_hash") + POSITION_FIELDS}
+    payload = text + "\0" + json.dumps(meta, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def chunk_position(metadata: dict) -> dict:
+    return {k: metadata[k] for k in POSITION_FIELDS if k in metadata}
+
+def vector_id(doc_id: str, chunk_hash: str) -> str:
+    # Derived from the chunk content, so an unchanged chunk keeps its ID across re-analyses
+    return f"{doc_id}#{chunk_hash[:32]}"
+
+def batch_by_tokens(token_counts, max_tokens: int = EMBED_BATCH_TOKENS, max_items: int = EMBED_BATCH_MAX_ITEMS):
+    # Group consecutive item indices so each batch stays under both limits
+    batches = []
+    current = []
+    current_tokens = 0
+    for i, tokens in enumerate(token_counts):
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+class ChunkManifest:
+    """Per-document record of the vector IDs currently in the index (SQLite, shared by the
+    API and the workers through the data volume).
+
+    A document without a manifest entry has never been indexed by this service version,
+    so its vectors in the index are unknown and must be replaced wholesale.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    doc_id TEXT NOT NULL,
+                    vector_id TEXT NOT NULL,
+                    position TEXT,
+                    PRIMARY KEY (doc_id, vector_id)
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+            if "position" not in columns:
+                conn.execute("ALTER TABLE chunks ADD COLUMN position TEXT")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def get(self, doc_id: str):
+        # {vector_id: position dict (None if unknown)}, or None if the document has no manifest
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone() is None:
+                return None
+            rows = conn.execute("SELECT vector_id, position FROM chunks WHERE doc_id = ?", (doc_id,)).fetchall()
+            return {vid: json.loads(position) if position else None for vid, position in rows}
+
+    def replace(self, doc_id: str, positions: dict):
+        # positions: {vector_id: position dict} of the chunks now indexed
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            conn.executemany(
+                "INSERT INTO chunks (doc_id, vector_id, position) VALUES (?, ?, ?)",
+                [(doc_id, vid, json.dumps(position, sort_keys=True)) for vid, position in positions.items()]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, updated_at) VALUES (?, ?)",
+                (doc_id, time.time())
+            )
+            conn.execute("COMMIT")
+
+    def delete(self, doc_id: str):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            conn.execute("COMMIT")
+
+    def doc_ids(self) -> list:
+        # Every document with vectors indexed by this service (used by the orphan sweeper)
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT doc_id FROM documents")]
+
+class VectorIndexer:
+    """Embeds chunks in token-bounded batches and upserts them with bounded parallelism.
+
+    Embedding batches and upsert batches overlap: a batch is upserted as soon as its
+    embeddings arrive, while later batches are still being embedded.
+
+    Re-indexing is incremental: chunk IDs are content hashes, so only chunks whose ID
+    is not in the document's manifest are embedded, and IDs that disappeared are deleted.
+    Unchanged chunks that only moved (another page) keep their vector; their position
+    metadata is updated in place.
+    """
+
+    def __init__(self, store, embeddings, manifest: ChunkManifest = None, model: str = None):
+        self.store = store  # vector_store.VectorStore
+        self.embeddings = embeddings
+        self.model = model  # embedding model, picks the tokenizer for batch budgets
+        self.manifest = manifest
+        self.embed_semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+        self.upsert_semaphore = asyncio.Semaphore(UPSERT_CONCURRENCY)
+
+    async def _upsert(self, vectors):
+        async with self.upsert_semaphore:
+            with stage("ingestion", "upsert_batch"):
+                await run_blocking(self.store.upsert, vectors=vectors)
+
+    async def _embed_and_upsert(self, ids, texts, metadatas):
+        async with self.embed_semaphore:
+            with stage("ingestion", "embed_batch", chunks=len(texts)):
+                values = await self.embeddings.aembed_documents(texts)
+        vectors = [
+            {"id": vid, "values": vec, "metadata": meta}
+            for vid, vec, meta in zip(ids, values, metadatas)
+        ]
+        await asyncio.gather(*[
+            self._upsert(vectors[i:i + UPSERT_BATCH_SIZE])
+            for i in range(0, len(vectors), UPSERT_BATCH_SIZE)
+        ])
+
+    async def _delete_ids(self, ids):
+        await asyncio.gather(*[
+            run_blocking(self.store.delete, ids=ids[i:i + DELETE_BATCH_SIZE])
+            for i in range(0, len(ids), DELETE_BATCH_SIZE)
+        ])
+
+    async def index_document(self, doc_id: str, texts, metadatas) -> dict:
+        started = time.perf_counter()
+
+        # Identical chunks (repeated headers, boilerplate) collapse to one vector
+        chunks = {}
+        for text, meta in zip(texts, metadatas):
+            chunk_hash = content_hash(text, meta)
+            vid = vector_id(doc_id, chunk_hash)
+            if vid not in chunks:
+                chunks[vid] = (text, {**meta, "content_hash": chunk_hash})
+
+        previous = await run_blocking(self.manifest.get, doc_id) if self.manifest else None
+        if previous is None:
+            # Unknown index state (first analysis, or vectors written before manifests
+            # existed): clear whatever is there and index everything
+            await run_blocking(self.store.delete, filter={"doc_id": doc_id})
+            previous = {}
+
+        new_ids = [vid for vid in chunks if vid not in previous]
+        removed_ids = sorted(previous.keys() - chunks.keys())
+        positions = {vid: chunk_position(meta) for vid, (_, meta) in chunks.items()}
+        moved = {vid: positions[vid] for vid in chunks if vid in previous and previous[vid] != positions[vid]}
+
+        new_texts = [chunks[vid][0] for vid in new_ids]
+        token_counts = await run_blocking(count_tokens_batch, new_texts, self.model)
+        batches = batch_by_tokens(token_counts)
+        await asyncio.gather(*[
+            self._embed_and_upsert(
+                [new_ids[i] for i in batch],
+                [new_texts[i] for i in batch],
+                [chunks[new_ids[i]][1] for i in batch]
+            )
+            for batch in batches
+        ])
+
+        if moved:
+            with stage("ingestion", "move_batch", chunks=len(moved)):
+                await run_blocking(self.store.set_metadata, moved)
+
+        # Only drop old vectors once their replacements are in, so retrieval never
+        # sees a half-empty document
+        if removed_ids:
+            await self._delete_ids(removed_ids)
+        if self.manifest:
+            await run_blocking(self.manifest.replace, doc_id, positions)
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "chunks": len(chunks),
+            "embedded": len(new_ids),
+            "unchanged": len(chunks) - len(new_ids),
+            "moved": len(moved),
+            "deleted": len(removed_ids),
+            "tokens": sum(token_counts),
+            "batches": len(batches),
+            "seconds": elapsed,
+            "chunks_per_second": len(new_ids) / elapsed if elapsed else 0.0,
+        }
+        logger.info("Indexed document", extra={"doc_id": doc_id, **stats})
+        return stats
@@ -0,0 +1,284 @@
+import logging
+import io
+import os
+import time
+import base64
+import random
+import hashlib
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+import openai
+from PIL import Image
+
+from io_pool import run_blocking
+from vision_cache import image_key
+from layout import page_items
+from metrics import stage, TOKENS
+
+logger = logging.getLogger("llm_service.ingestion")
+
+# Concurrent document ingestion:
+#   1. page text/image extraction runs in a process pool (PyMuPDF is CPU bound),
+#   2. image blocks are sent to the vision model concurrently, bounded by a semaphore
+#      and retried with exponential backoff on rate limits / transient errors,
+#   3. results are reassembled in page/block order.
+
+INGESTION_PROCESSES = int(os.getenv("INGESTION_PROCESSES", str(min(4, os.cpu_count() or 1))))
+VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "8"))
+VISION_MAX_RETRIES = int(os.getenv("VISION_MAX_RETRIES", "5"))
+VISION_MODEL = "gpt-4o-mini"
+# Images are downscaled so the longest side fits this many pixels before being sent inline
+VISION_MAX_IMAGE_SIDE = int(os.getenv("VISION_MAX_IMAGE_SIDE", "2048"))
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+
+# Pages handed to one worker at a time; small enough to balance, large enough to
+# amortize reopening the PDF in the worker
+PAGES_PER_TASK = 8
+
+VISION_SYSTEM_PROMPT = (
+    "You are a professional document digitizer. Your mission is to extract tables with 100% completeness, "
+    "ensuring no rows are omitted from the bottom of the image."
+)
+
+VISION_USER_PROMPT = (
+    "Extract the table from this image into Markdown by following these structural rules:\n\n"
+    "1. **Full Image Scan**: Process the image from the very top header to the very last row at the bottom (e.g., '10억원 초과'). DO NOT stop until the entire table is transcribed.\n"
+    "2. **Analyze Vertical Alignment**: Determine columns based on strict vertical alignment. "
+    "Do not create new columns unless there is a clear, consistent vertical gap or divider.\n"
+    "3. **Cell Consolidation**: If a single cell contains multiple lines of text (e.g., range values), "
+    "keep them within the same Markdown cell. Use `<br>` for line breaks inside the cell instead of splitting them into new rows or columns.\n"
+    "4. **Literal Transcription**: Transcribe every number, symbol, and word exactly as shown. Do not summarize or omit any data.\n"
+    "5. **No Conversational Filler**: Output ONLY the Markdown table or content.\n\n"
+    "For charts or diagrams, provide a structured nested list."
+    "6. **Row Alignment**: Stacked text within a visual row belongs to the SAME cell. Join them with a space or `<br>` within that single cell. Do not shift them into the next row or a new column.\n"
+    "7. **Output**: Provide ONLY the Markdown table. No headers like 'Here is the table'."
+)
+
+# Part of every vision cache key: changing the model or prompts invalidates old entries
+VISION_PROMPT_VERSION = hashlib.sha256(
+    f"{VISION_MODEL}\0{VISION_SYSTEM_PROMPT}\0{VISION_USER_PROMPT}".encode("utf-8")
+).hexdigest()[:16]
+
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+_process_pool = None
+
+def get_process_pool():
+    # "spawn" so workers don't inherit the API process's threads and sockets
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=INGESTION_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+def extract_page_range(pdf_path: str, start: int, end: int):
+    # Runs in a worker process. Returns one list of ("text", str) / ("table", str) /
+    # ("image", bytes) items per page, in reading order (see layout.py).
+    doc = fitz.open(pdf_path)
+    try:
+        return [page_items(doc[page_num]) for page_num in range(start, end)]
+    finally:
+        doc.close()
+
+async def extract_pdf_pages(pdf_path: str):
+    doc = fitz.open(pdf_path)
+    page_count = doc.page_count
+    doc.close()
+
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    ranges = [(s, min(s + PAGES_PER_TASK, page_count)) for s in range(0, page_count, PAGES_PER_TASK)]
+    results = await asyncio.gather(*[
+        loop.run_in_executor(pool, extract_page_range, pdf_path, start, end)
+        for start, end in ranges
+    ])
+    # gather preserves task order, so pages come back in document order
+    return [page for chunk in results for page in chunk]
+
+def prepare_image(image_bytes: bytes, max_side: int = VISION_MAX_IMAGE_SIDE, quality: int = VISION_JPEG_QUALITY) -> str:
+    # Downscale/recompress an embedded image and return it as a base64 data URL, so the
+    # vision model receives it inline (no temp upload, signed URL or cleanup round-trips)
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img.load()
+            if img.mode in ("RGBA", "LA", "P"):
+                # Flatten transparency onto white; JPEG has no alpha channel
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, "white")
+                img.paste(rgba, mask=rgba.split()[-1])
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            if max(img.size) > max_side:
+                img.thumbnail((max_side, max_side), Image.LANCZOS)
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=quality, optimize=True)
+            return f"data:image/jpeg;base64,{base64.b64encode(out.getvalue()).decode('utf-8')}"
+    except Exception as e:
+        # Formats Pillow can't decode are passed through untouched
+        logger.warning("Image preparation failed, sending original bytes", extra={"error": str(e)})
+        return f"data:image/png;base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+
+class VisionAnalyzer:
+    """Bounded, retrying client for table/chart extraction with the vision model."""
+
+    def __init__(self, api_key: str, concurrency: int = VISION_CONCURRENCY, max_retries: int = VISION_MAX_RETRIES,
+                 cache=None):
+        # Retries are handled here (with jitter) rather than by the SDK
+        self.client = openai.AsyncOpenAI(api_key=api_key, max_retries=0)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+        self.cache = cache
+        # Identical images being analyzed right now share one vision call
+        self._inflight = {}
+
+    async def analyze(self, image_url: str) -> str:
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with stage("ingestion", "vision_call"):
+                        response = await self.client.chat.completions.create(
+                            model=VISION_MODEL,
+                            messages=[
+                                {"role": "system", "content": VISION_SYSTEM_PROMPT},
+                                {
+                                    "role": "user",
+                                    "content": [
+                                        {"type": "text", "text": VISION_USER_PROMPT},
+                                        {"type": "image_url", "image_url": {"url": image_url}}
+                                    ],
+                                }
+                            ],
+                            max_tokens=2000,
+                            temperature=0.0,
+                        )
+                    if response.usage:
+                        TOKENS.labels(model=VISION_MODEL, kind="prompt").inc(response.usage.prompt_tokens)
+                        TOKENS.labels(model=VISION_MODEL, kind="completion").inc(response.usage.completion_tokens)
+                    return response.choices[0].message.content
+                except _RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = min(30.0, 2 ** attempt) + random.uniform(0, 1)
+                    logger.info("Vision call failed, retrying", extra={
+                        "error": type(e).__name__, "delay_s": round(delay, 1), "attempt": attempt + 1
+                    })
+                    await asyncio.sleep(delay)
+
+    async def describe(self, image_bytes: bytes, stats: dict = None) -> str:
+        # stats (optional, per document): images / cache_hits / vision_calls counters
+        if stats is not None:
+            stats["images"] = stats.get("images", 0) + 1
+        if self.cache is None:
+            return await self._describe_uncached(image_bytes, stats)
+
+        key = await run_blocking(image_key, image_bytes, VISION_PROMPT_VERSION)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            if stats is not None:
+                stats["cache_hits"] = stats.get("cache_hits", 0) + 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            markdown_text = await run_blocking(self.cache.get, key)
+            if markdown_text is not None:
+                if stats is not None:
+                    stats["cache_hits"] = stats.get("cache_hits", 0) + 1
+            else:
+                markdown_text = await self._describe_uncached(image_bytes, stats)
+                await run_blocking(self.cache.put, key, markdown_text)
+            future.set_result(markdown_text)
+            return markdown_text
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _describe_uncached(self, image_bytes: bytes, stats: dict = None) -> str:
+        if stats is not None:
+            stats["vision_calls"] = stats.get("vision_calls", 0) + 1
+        image_url = await run_blocking(prepare_image, image_bytes)
+        return await self.analyze(image_url)
+
+async def render_markdown(pages, describe_image, concurrency: int = VISION_CONCURRENCY, progress=None) -> list:
+    # Fan out every image block at once (bounded), then stitch each page back together in
+    # order. Returns one Markdown string per page; progress(pages_done, pages_total) is
+    # called as pages finish.
+    semaphore = asyncio.Semaphore(concurrency)
+    remaining = [sum(1 for item in items if item[0] == "image") for items in pages]
+    pages_done = sum(1 for count in remaining if count == 0)
+    if progress:
+        progress(pages_done, len(pages))
+
+    async def run_image(page_num, image_bytes):
+        nonlocal pages_done
+        async with semaphore:
+            try:
+                img_markdown = await describe_image(image_bytes)
+                logger.debug("Vision analysis result", extra={"page": page_num + 1, "chars": len(img_markdown)})
+                return f"\n> **Image Analysis**:\n{img_markdown}\n"
+            except Exception as img_err:
+                logger.warning("Image processing failed", extra={"page": page_num + 1, "error": str(img_err)})
+                return None
+            finally:
+                remaining[page_num] -= 1
+                if remaining[page_num] == 0:
+                    pages_done += 1
+                    if progress:
+                        progress(pages_done, len(pages))
+
+    image_tasks = {}
+    for page_num, items in enumerate(pages):
+        for block_num, item in enumerate(items):
+            if item[0] == "image":
+                image_tasks[(page_num, block_num)] = asyncio.ensure_future(run_image(page_num, item[1]))
+    logger.info("Analyzing image blocks", extra={"images": len(image_tasks), "pages": len(pages)})
+    if image_tasks:
+        await asyncio.gather(*image_tasks.values())
+
+    final_markdown_parts = []
+    for page_num, items in enumerate(pages):
+        page_content = []
+        for block_num, item in enumerate(items):
+            if item[0] != "image":
+                page_content.append(item[1] + "\n")
+            else:
+                result = image_tasks[(page_num, block_num)].result()
+                if result:
+                    page_content.append(result)
+        final_markdown_parts.append("\n".join(page_content))
+    return final_markdown_parts
+
+async def pdf_to_markdown(pdf_path: str, describe_image, progress=None) -> list:
+    # Per-page Markdown, so later stages (chunking, incremental re-indexing) can keep
+    # page boundaries
+    started = time.perf_counter()
+    with stage("ingestion", "extract"):
+        pages = await extract_pdf_pages(pdf_path)
+    extracted = time.perf_counter()
+    with stage("ingestion", "vision", pages=len(pages)):
+        page_markdowns = await render_markdown(pages, describe_image, progress=progress)
+    finished = time.perf_counter()
+
+    total = finished - started
+    logger.info("Converted PDF to Markdown", extra={
+        "pages": len(pages),
+        "extract_s": round(extracted - started, 2),
+        "vision_s": round(finished - extracted, 2),
+        "pages_per_second": round(len(pages) / total, 2) if total else 0.0,
+    })
+    return page_markdowns
@@ -0,0 +1,31 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# The Supabase, Pinecone and sync OpenAI SDKs are blocking. Every call to them goes
+# through this bounded pool so a slow round-trip never stalls the event loop, and the
+# pool size caps how many concurrent connections one worker opens to each backend.
+# The SDK clients themselves are created once in main.py and shared, so their
+# underlying HTTP connection pools are reused across requests.
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="io")
+
+# Strong references to fire-and-forget tasks (asyncio only keeps weak ones)
+_background_tasks = set()
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+async def execute(query):
+    # Run a Supabase/PostgREST query builder off the event loop
+    return await run_blocking(query.execute)
+
+def spawn(coro):
+    # Schedule a coroutine that must finish even if the caller is cancelled
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
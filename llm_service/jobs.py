@@ -0,0 +1,289 @@
+import logging
+import os
+import json
+import time
+import uuid
+import socket
+import random
+import sqlite3
+import asyncio
+from contextlib import contextmanager
+
+from io_pool import run_blocking
+
+logger = logging.getLogger("llm_service.jobs")
+
+# Durable ingestion job queue backed by SQLite (one file shared by the API and the
+# worker containers through the data volume). Jobs are claimed with a lease; a worker
+# that dies stops renewing it and the job is put back in the queue by recover_stale().
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class JobQueue:
+    def __init__(self, path: str, max_attempts: int = 3, lease_seconds: int = 120):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    run_after REAL NOT NULL,
+                    locked_by TEXT,
+                    lease_expires REAL,
+                    pages_done INTEGER NOT NULL DEFAULT 0,
+                    pages_total INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, run_after)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_doc ON jobs (doc_id, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps this safe across threads and processes
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def enqueue(self, doc_id: str, payload: dict) -> dict:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # One active job per document
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE doc_id = ? AND status IN (?, ?)",
+                (doc_id, QUEUED, RUNNING)
+            ).fetchone()
+            if row is None:
+                job_id = str(uuid.uuid4())
+                conn.execute(
+                    "INSERT INTO jobs (id, doc_id, payload, status, max_attempts, run_after, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, doc_id, json.dumps(payload), QUEUED, self.max_attempts, now, now, now)
+                )
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            conn.execute("COMMIT")
+            return self._to_dict(row)
+
+    def claim(self, worker_id: str):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? AND run_after <= ? ORDER BY run_after, created_at LIMIT 1",
+                (QUEUED, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, locked_by = ?, lease_expires = ?, attempts = attempts + 1, "
+                "error = NULL, updated_at = ? WHERE id = ?",
+                (RUNNING, worker_id, now + self.lease_seconds, now, row["id"])
+            )
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+            return self._to_dict(job)
+
+    def heartbeat(self, job_id: str, pages_done: int = None, pages_total: int = None):
+        # Renew the lease and record progress
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ?, "
+                "pages_done = COALESCE(?, pages_done), pages_total = COALESCE(?, pages_total) "
+                "WHERE id = ? AND status = ?",
+                (now + self.lease_seconds, now, pages_done, pages_total, job_id, RUNNING)
+            )
+
+    def complete(self, job_id: str):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, locked_by = NULL, lease_expires = NULL, "
+                "pages_done = pages_total, updated_at = ? WHERE id = ?",
+                (DONE, now, job_id)
+            )
+
+    def fail(self, job_id: str, error: str) -> bool:
+        # Returns True if the job will be retried, False if it gave up
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            retry = row is not None and row["attempts"] < row["max_attempts"]
+            if retry:
+                # Exponential backoff with jitter: ~30s, 60s, 120s...
+                delay = 30 * 2 ** (row["attempts"] - 1) + random.uniform(0, 5)
+                conn.execute(
+                    "UPDATE jobs SET status = ?, locked_by = NULL, lease_expires = NULL, run_after = ?, "
+                    "error = ?, updated_at = ? WHERE id = ?",
+                    (QUEUED, now + delay, error, now, job_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, locked_by = NULL, lease_expires = NULL, error = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (FAILED, error, now, job_id)
+                )
+            conn.execute("COMMIT")
+            return retry
+
+    def recover_stale(self) -> list:
+        # Jobs whose worker stopped heartbeating go back to the queue (or fail if out of attempts).
+        # Returns the jobs that were given up on.
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? AND lease_expires < ?", (RUNNING, now)
+            ).fetchall()
+            given_up = []
+            for row in stale:
+                if row["attempts"] < row["max_attempts"]:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, locked_by = NULL, lease_expires = NULL, run_after = ?, "
+                        "error = ?, updated_at = ? WHERE id = ?",
+                        (QUEUED, now, "worker lease expired", now, row["id"])
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, locked_by = NULL, lease_expires = NULL, error = ?, "
+                        "updated_at = ? WHERE id = ?",
+                        (FAILED, "worker lease expired", now, row["id"])
+                    )
+                    given_up.append(self._to_dict(row))
+            conn.execute("COMMIT")
+            if stale:
+                logger.warning("Recovered stale ingestion jobs", extra={"jobs": len(stale)})
+            return given_up
+
+    def has_active_job(self, doc_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM jobs WHERE doc_id = ? AND status IN (?, ?)", (doc_id, QUEUED, RUNNING)
+            ).fetchone()
+            return row is not None
+
+    def latest_for_docs(self, doc_ids) -> dict:
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {}
+        placeholders = ",".join("?" * len(doc_ids))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE doc_id IN ({placeholders}) ORDER BY created_at",
+                doc_ids
+            ).fetchall()
+        # Later rows overwrite earlier ones, leaving the newest job per document
+        return {row["doc_id"]: self._to_dict(row) for row in rows}
+
+    def completed_since(self, since: float) -> list:
+        # (doc_id, updated_at) of jobs finished after `since`, oldest first
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT doc_id, updated_at FROM jobs WHERE status = ? AND updated_at > ? ORDER BY updated_at",
+                (DONE, since)
+            ).fetchall()
+        return [(row["doc_id"], row["updated_at"]) for row in rows]
+
+    def depth(self) -> dict:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+def job_progress(job: dict) -> dict:
+    # Shape surfaced through GET /documents
+    return {
+        "job_status": job["status"],
+        "attempts": job["attempts"],
+        "pages_done": job["pages_done"],
+        "pages_total": job["pages_total"],
+        "error": job["error"],
+    }
+
+async def run_job(queue: JobQueue, job: dict, handler, on_give_up, heartbeat_seconds: float):
+    progress = {"done": None, "total": None}
+
+    def report_progress(done: int, total: int):
+        progress["done"], progress["total"] = done, total
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(heartbeat_seconds)
+            await run_blocking(queue.heartbeat, job["id"], progress["done"], progress["total"])
+
+    beat = asyncio.ensure_future(heartbeat())
+    try:
+        await handler(job, report_progress)
+        beat.cancel()
+        await run_blocking(queue.complete, job["id"])
+        logger.info("Ingestion job completed", extra={"job_id": job["id"], "doc_id": job["doc_id"]})
+    except Exception as e:
+        beat.cancel()
+        retry = await run_blocking(queue.fail, job["id"], str(e))
+        logger.log(logging.WARNING if retry else logging.ERROR, "Ingestion job failed", extra={
+            "job_id": job["id"],
+            "doc_id": job["doc_id"],
+            "attempt": job["attempts"],
+            "max_attempts": job["max_attempts"],
+            "will_retry": retry,
+            "error": str(e),
+        })
+        if not retry:
+            await on_give_up(job)
+
+async def run_worker(queue: JobQueue, handler, on_give_up, concurrency: int = 2,
+                     poll_seconds: float = 2.0, heartbeat_seconds: float = 15.0):
+    """Claim and run jobs with at most `concurrency` in flight; runs until cancelled."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    logger.info("Ingestion worker started", extra={"worker_id": worker_id, "concurrency": concurrency})
+
+    async def slot():
+        last_recovery = 0.0
+        while True:
+            try:
+                if time.monotonic() - last_recovery > heartbeat_seconds:
+                    last_recovery = time.monotonic()
+                    for job in await run_blocking(queue.recover_stale):
+                        await on_give_up(job)
+                job = await run_blocking(queue.claim, worker_id)
+                if job is None:
+                    await asyncio.sleep(poll_seconds)
+                    continue
+                await run_job(queue, job, handler, on_give_up, heartbeat_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Ingestion worker error")
+                await asyncio.sleep(poll_seconds)
+
+    await asyncio.gather(*[slot() for _ in range(concurrency)])
@@ -0,0 +1,176 @@
+import re
+import json
+import math
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+
+from vector_store import Match, matches_filter, indexed_values
+
+# BM25 keyword index over the same chunks that go into the vector store. Dense search
+# is weak on exact tokens (codes, amounts, Korean table labels such as "10억원 초과"), so
+# the retriever fuses both result lists (see retrieval.py).
+#
+# Stored in SQLite under DATA_DIR (shared by the API and the workers): one row per chunk
+# and an inverted index of (term, chunk, tf) postings. Documents are replaced wholesale
+# on every (re-)analysis, which is cheap next to embedding.
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD = re.compile(r"\w+(?:[.,/%-]\w+)*")
+_PART = re.compile(r"[0-9]+|[a-z]+|[가-힣]+|[^\W\d_a-z가-힣]+")
+_HANGUL = re.compile(r"[가-힣]{2,}")
+
+def tokenize(text: str) -> list:
+    """Index terms for a text: whole words ("10억원", "a-1024", "1,000"), their script/digit
+    parts ("10", "억원"), and character bigrams of Hangul runs so a stem still matches
+    when a particle is attached ("초과하는" -> "초과", "과하", "하는")."""
+    terms = []
+    for word in _WORD.findall(text.lower()):
+        terms.append(word)
+        parts = _PART.findall(word)
+        if len(parts) > 1:
+            terms.extend(parts)
+            if "," in word:
+                terms.append(word.replace(",", ""))
+        for run in _HANGUL.findall(word):
+            if len(run) > 2:
+                terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+class KeywordIndex:
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    chunk INTEGER PRIMARY KEY,
+                    id TEXT UNIQUE NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    user_id TEXT,
+                    length INTEGER NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+            if "user_id" not in columns:
+                conn.execute("ALTER TABLE chunks ADD COLUMN user_id TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc ON chunks (doc_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_user ON chunks (user_id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    chunk INTEGER NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, chunk)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _delete_doc(conn, doc_id: str):
+        conn.execute("DELETE FROM postings WHERE chunk IN (SELECT chunk FROM chunks WHERE doc_id = ?)", (doc_id,))
+        conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+
+    def index_document(self, doc_id: str, texts: list, metadatas: list):
+        """Replaces the document's chunks. metadatas carry the chunk body under "text",
+        like the vector store metadata, so results can be returned as-is."""
+        with self._connect() as conn:
+            self._delete_doc(conn, doc_id)
+            for i, (text, metadata) in enumerate(zip(texts, metadatas)):
+                terms = Counter(tokenize(text))
+                cur = conn.execute(
+                    "INSERT INTO chunks (id, doc_id, user_id, length, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (f"{doc_id}:{i}", doc_id, metadata.get("user_id"), sum(terms.values()),
+                     json.dumps(metadata, ensure_ascii=False))
+                )
+                conn.executemany(
+                    "INSERT INTO postings (term, chunk, tf) VALUES (?, ?, ?)",
+                    [(term, cur.lastrowid, tf) for term, tf in terms.items()]
+                )
+
+    def delete_document(self, doc_id: str):
+        with self._connect() as conn:
+            self._delete_doc(conn, doc_id)
+
+    def doc_ids(self) -> list:
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT doc_id FROM chunks")]
+
+    @staticmethod
+    def _scope(filter: dict):
+        # doc_id / user_id conditions of the filter as SQL on the indexed chunk columns
+        clauses, params = [], []
+        for column in ("doc_id", "user_id"):
+            values = indexed_values(filter, column)
+            if values is not None:
+                clauses.append(f"c.{column} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+        return "".join(f" AND {clause}" for clause in clauses), params
+
+    def search(self, query: str, top_k: int, filter: dict = None) -> list:
+        """Top chunks by BM25. `filter` uses the vector store's metadata filter syntax;
+        its doc_id / user_id conditions are applied in the postings query."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        scope_sql, scope_params = self._scope(filter)
+        with self._connect() as conn:
+            total, avg_length = conn.execute("SELECT COUNT(*), AVG(length) FROM chunks").fetchone()
+            if not total:
+                return []
+            scores = Counter()
+            for term in terms:
+                # Document frequency is corpus-wide so scores don't depend on the scope
+                df = conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+                if not df:
+                    continue
+                postings = conn.execute(
+                    "SELECT p.chunk, p.tf, c.length FROM postings p JOIN chunks c ON c.chunk = p.chunk "
+                    "WHERE p.term = ?" + scope_sql,
+                    [term] + scope_params
+                ).fetchall()
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                for chunk, tf, length in postings:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[chunk] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+            # Metadata is only loaded for the best candidates, in score order, until
+            # top_k of them pass the filter
+            results = []
+            ranked = scores.most_common()
+            for start in range(0, len(ranked), 200):
+                batch = ranked[start:start + 200]
+                rows = dict(
+                    (chunk, (cid, metadata)) for chunk, cid, metadata in conn.execute(
+                        f"SELECT chunk, id, metadata FROM chunks WHERE chunk IN ({','.join('?' * len(batch))})",
+                        [chunk for chunk, _ in batch]
+                    )
+                )
+                for chunk, score in batch:
+                    cid, metadata = rows[chunk]
+                    metadata = json.loads(metadata)
+                    if filter is None or matches_filter(metadata, filter):
+                        results.append(Match(cid, score, metadata))
+                        if len(results) == top_k:
+                            return results
+            return results
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            chunks, documents = conn.execute("SELECT COUNT(*), COUNT(DISTINCT doc_id) FROM chunks").fetchone()
+        return {"chunks": chunks, "documents": documents}
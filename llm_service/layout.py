@@ -0,0 +1,201 @@
+import os
+from collections import Counter
+
+# Layout-aware page extraction on top of PyMuPDF, run inside the extraction worker
+# processes. A page becomes a list of ("text", str) / ("table", markdown) /
+# ("image", bytes) items in reading order:
+#
+# - Vector/ruled tables found by page.find_tables() are emitted as Markdown tables and
+#   the text blocks they cover are dropped, so tables no longer need a vision call.
+# - Blocks are ordered by column: full-width blocks split the page into horizontal
+#   bands, and inside a band the narrower blocks are read column by column.
+# - Spans are joined with a space where the glyph gap says there is one, and large or
+#   bold short blocks become Markdown headings (used by the chunker for section paths).
+# - Only raster images at least VISION_MIN_IMAGE_PX on each side go to vision.
+
+VISION_MIN_IMAGE_PX = int(os.getenv("VISION_MIN_IMAGE_PX", "64"))
+TABLE_DETECTION = os.getenv("TABLE_DETECTION", "true").lower() == "true"
+
+# A block wider than this share of the text area spans the columns
+FULL_WIDTH_RATIO = 0.6
+# Minimum horizontal whitespace (points) between two columns
+MIN_GUTTER = 8.0
+# A gap wider than this share of the font size between two spans is a space
+SPACE_GAP_RATIO = 0.15
+HEADING_MAX_CHARS = 200
+
+def _overlap_ratio(inner, outer) -> float:
+    # Share of `inner`'s area that lies inside `outer`
+    x0, y0 = max(inner[0], outer[0]), max(inner[1], outer[1])
+    x1, y1 = min(inner[2], outer[2]), min(inner[3], outer[3])
+    if x1 <= x0 or y1 <= y0:
+        return 0.0
+    area = (inner[2] - inner[0]) * (inner[3] - inner[1])
+    return (x1 - x0) * (y1 - y0) / area if area > 0 else 0.0
+
+def _cell_text(value) -> str:
+    return " ".join((value or "").split()).replace("|", "\\|")
+
+def table_to_markdown(header, rows) -> str:
+    width = max([len(header)] + [len(row) for row in rows]) if header or rows else 0
+    if width == 0:
+        return ""
+
+    def fmt(row):
+        cells = [_cell_text(c) for c in row] + [""] * (width - len(row))
+        return "| " + " | ".join(cells) + " |"
+
+    lines = [fmt(header), "| " + " | ".join(["---"] * width) + " |"]
+    lines.extend(fmt(row) for row in rows)
+    return "\n".join(lines)
+
+def extract_tables(page):
+    # [(bbox, markdown)] for tables PyMuPDF detects from ruling lines and text alignment
+    if not TABLE_DETECTION:
+        return []
+    try:
+        found = page.find_tables()
+    except Exception:
+        return []
+    tables = []
+    for table in found.tables:
+        rows = table.extract()
+        if not rows:
+            continue
+        if table.header is not None and table.header.external:
+            header = table.header.names
+        else:
+            header, rows = rows[0], rows[1:]
+        # A 1-column "table" is usually a framed paragraph; keep it as text
+        if max([len(header)] + [len(r) for r in rows]) < 2:
+            continue
+        markdown = table_to_markdown(header, rows)
+        if markdown:
+            tables.append((tuple(table.bbox), markdown))
+    return tables
+
+def line_text(line) -> str:
+    # Join spans, inserting a space where the gap between them is wider than a fraction
+    # of the font size (PDF writers often position words instead of emitting spaces)
+    parts = []
+    prev = None
+    for span in line["spans"]:
+        text = span["text"]
+        if not text:
+            continue
+        if prev is not None:
+            gap = span["bbox"][0] - prev["bbox"][2]
+            if gap > SPACE_GAP_RATIO * max(span["size"], 1.0) \
+                    and not parts[-1].endswith(" ") and not text.startswith(" "):
+                parts.append(" ")
+        parts.append(text)
+        prev = span
+    return "".join(parts)
+
+def body_font_size(blocks) -> float:
+    # Most common font size weighted by characters
+    sizes = Counter()
+    for block in blocks:
+        for line in block.get("lines", []):
+            for span in line["spans"]:
+                sizes[round(span["size"], 1)] += len(span["text"].strip())
+    return sizes.most_common(1)[0][0] if sizes else 0.0
+
+def heading_level(block, body_size: float, text: str) -> int:
+    # 1-3 for blocks that look like headings, 0 otherwise
+    if not body_size or len(text) > HEADING_MAX_CHARS or len(block["lines"]) > 3:
+        return 0
+    spans = [s for line in block["lines"] for s in line["spans"] if s["text"].strip()]
+    if not spans:
+        return 0
+    size = max(s["size"] for s in spans)
+    bold = all(s["flags"] & 16 for s in spans)
+    ratio = size / body_size
+    if ratio >= 1.6:
+        return 1
+    if ratio >= 1.3:
+        return 2
+    if ratio >= 1.1 and bold:
+        return 3
+    return 0
+
+def block_text(block, body_size: float) -> str:
+    lines = [line_text(line) for line in block["lines"]]
+    text = "\n".join(l for l in lines if l.strip())
+    if not text.strip():
+        return ""
+    level = heading_level(block, body_size, text)
+    if level:
+        return "#" * level + " " + " ".join(text.split())
+    return text
+
+def column_spans(elements, full_width: float):
+    # Merge the x-ranges of narrow elements; separate ranges (split by a gutter) are columns
+    ranges = sorted((e["bbox"][0], e["bbox"][2]) for e in elements if e["bbox"][2] - e["bbox"][0] < full_width)
+    columns = []
+    for x0, x1 in ranges:
+        if columns and x0 < columns[-1][1] + MIN_GUTTER:
+            columns[-1][1] = max(columns[-1][1], x1)
+        else:
+            columns.append([x0, x1])
+    return columns
+
+def reading_order(elements, text_width: float):
+    """Orders elements (dicts with a "bbox") for multi-column pages.
+
+    Full-width elements are emitted in vertical order; the elements between two of them
+    form a band that is read column by column, each column top to bottom.
+    """
+    full_width = FULL_WIDTH_RATIO * text_width
+    elements = sorted(elements, key=lambda e: (e["bbox"][1], e["bbox"][0]))
+    ordered = []
+    band = []
+
+    def flush():
+        columns = column_spans(band, full_width)
+        if len(columns) <= 1:
+            ordered.extend(sorted(band, key=lambda e: (e["bbox"][1], e["bbox"][0])))
+        else:
+            def column_of(e):
+                center = (e["bbox"][0] + e["bbox"][2]) / 2
+                for i, (x0, x1) in enumerate(columns):
+                    if center <= x1 + MIN_GUTTER / 2:
+                        return i
+                return len(columns) - 1
+            ordered.extend(sorted(band, key=lambda e: (column_of(e), e["bbox"][1], e["bbox"][0])))
+        band.clear()
+
+    for element in elements:
+        if element["bbox"][2] - element["bbox"][0] >= full_width:
+            flush()
+            ordered.append(element)
+        else:
+            band.append(element)
+    flush()
+    return ordered
+
+def page_items(page):
+    tables = extract_tables(page)
+    blocks = page.get_text("dict")["blocks"]
+    body_size = body_font_size(b for b in blocks if b["type"] == 0)
+
+    elements = [{"bbox": bbox, "item": ("table", markdown)} for bbox, markdown in tables]
+    for block in blocks:
+        bbox = tuple(block["bbox"])
+        # Text and images inside a detected table are already part of its Markdown
+        if any(_overlap_ratio(bbox, table_bbox) > 0.5 for table_bbox, _ in tables):
+            continue
+        if block["type"] == 0:
+            text = block_text(block, body_size)
+            if text:
+                elements.append({"bbox": bbox, "item": ("text", text)})
+        elif block["type"] == 1:
+            # Icons, bullets and rules aren't worth a vision call
+            if min(block.get("width", 0), block.get("height", 0)) >= VISION_MIN_IMAGE_PX:
+                elements.append({"bbox": bbox, "item": ("image", block["image"])})
+
+    if not elements:
+        return []
+    text_x0 = min(e["bbox"][0] for e in elements)
+    text_x1 = max(e["bbox"][2] for e in elements)
+    return [e["item"] for e in reading_order(elements, text_x1 - text_x0)]
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import uuid
+import datetime
+import concurrent.futures
+
+import jwt
+import requests
+from dotenv import load_dotenv
+
+# Manual load test: hammers an endpoint at increasing concurrency and prints latency
+# percentiles. With the blocking SDK calls offloaded (io_pool.py), p99 should stay
+# roughly flat as concurrency grows instead of climbing with the number of requests
+# queued behind one slow Supabase round-trip.
+#
+# Usage: python load_test.py [path] [requests_per_level]
+#   LOAD_TEST_URL   (default http://localhost:8000)
+#   LOAD_TEST_TOKEN (optional; otherwise a token is signed with JWT_SECRET)
+
+load_dotenv()
+
+CONCURRENCY_LEVELS = [1, 8, 32, 64]
+
+def make_token():
+    token = os.getenv("LOAD_TEST_TOKEN")
+    if token:
+        return token
+    payload = {
+        "id": os.getenv("LOAD_TEST_USER_ID", str(uuid.uuid4())),
+        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+    }
+    return jwt.encode(payload, os.getenv("JWT_SECRET"), algorithm=os.getenv("ALGORITHM", "HS256"))
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_level(session, url, headers, concurrency, total):
+    def one_request(_):
+        start = time.perf_counter()
+        try:
+            resp = session.get(url, headers=headers, timeout=60)
+            ok = resp.status_code < 500
+        except Exception:
+            ok = False
+        return (time.perf_counter() - start) * 1000, ok
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_request, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(r[0] for r in results)
+    errors = sum(1 for r in results if not r[1])
+    print(f"  c={concurrency:<3} rps={total / elapsed:7.1f}  "
+          f"p50={percentile(latencies, 50):7.1f}ms  p95={percentile(latencies, 95):7.1f}ms  "
+          f"p99={percentile(latencies, 99):7.1f}ms  errors={errors}")
+
+def load_test():
+    base_url = os.getenv("LOAD_TEST_URL", "http://localhost:8000")
+    path = sys.argv[1] if len(sys.argv) > 1 else "/sessions"
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    url = f"{base_url}{path}"
+    headers = {"Authorization": f"Bearer {make_token()}"}
+
+    print(f"Load testing GET {url} ({total} requests per level)...")
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(CONCURRENCY_LEVELS))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    for concurrency in CONCURRENCY_LEVELS:
+        run_level(session, url, headers, concurrency, total)
+
+if __name__ == "__main__":
+    load_test()
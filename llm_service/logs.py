@@ -0,0 +1,162 @@
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+# Structured logging for the service: one JSON object per line, written by a background
+# thread (QueueListener) so a log call never blocks the event loop on stdout.
+#
+#   logger = logging.getLogger("llm_service.chat")
+#   logger.info("Retrieved context", extra={"chunks": 4, "session_id": sid})
+#
+# Anything passed in `extra` becomes a top-level field. Large payloads (document
+# dumps, chunk previews) are logged at DEBUG and only rendered when LOG_LEVEL=DEBUG.
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+# Set by the auth dependency (main.verify_token) for the rest of the request
+user_id_var = contextvars.ContextVar("user_id", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    # Human-readable variant for local development (LOG_FORMAT=text)
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        fields = {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRS and k != "request_id"}
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+class ContextFilter(logging.Filter):
+    # Runs on the calling thread, so the request id is captured before the record is queued
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        if not hasattr(record, "user_id"):
+            user_id = user_id_var.get()
+            if user_id:
+                record.user_id = user_id
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of records below WARNING for the configured logger prefixes.
+
+    `rates` maps a logger name prefix to a keep probability, e.g. {"llm_service.http": 0.1}.
+    Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        # Longest prefix first so "a.b" overrides "a"
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return rate >= 1.0 or random.random() < rate
+        return True
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: records are dropped (and counted) when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args into the message now, but keep exc_info and extra fields for the formatter
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def parse_sample_rates(spec: str) -> dict:
+    # "llm_service.http=0.1,llm_service.chat=0.5"
+    rates = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, rate = part.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+_listener = None
+
+@atexit.register
+def _stop_listener():
+    # Flush queued records on shutdown
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def setup_logging(level: str = "INFO", fmt: str = "json", sample_rates: dict = None, queue_size: int = 10000):
+    """Routes all logging through a bounded queue drained by one writer thread.
+
+    When the queue is full, records are dropped instead of blocking the caller.
+    Calling it again replaces the previous configuration.
+    """
+    global _listener
+    _stop_listener()
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(ContextFilter())
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    # Route uvicorn's own loggers through the same pipeline. Its access log duplicates
+    # the request log written by the API middleware, so only its warnings are kept.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+    # Client libraries log every HTTP call at INFO
+    for name in ("httpx", "httpcore", "openai", "urllib3"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = QueueListener(handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+    return handler
@@ -1,42 +1,94 @@
 import os
+import time
 import uuid
-# import tiktoken
+import hashlib
+import logging
 import datetime
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Header, Depends, UploadFile, File
+from fastapi import FastAPI, HTTPException, Header, Depends, UploadFile, File, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, Response
+from pydantic import BaseModel, Field
+from typing import Optional, Literal, List
 import jwt
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from langchain_pinecone import PineconeVectorStore
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader
-from pinecone import Pinecone
 from supabase import create_client, Client
-from fastapi import BackgroundTasks
+from postgrest.exceptions import APIError
 import io
+import json
 import tempfile
 import pypdf
 
-import markdown
-from bs4 import BeautifulSoup
 import asyncio
+from io_pool import run_blocking, execute, spawn
+from retrieval import Retriever, RetrievalOptions, LexicalReranker, CrossEncoderReranker, chunk_id
+from keyword_index import KeywordIndex
+from response_cache import SemanticResponseCache
+from history import HistoryManager
+from tokens import count_tokens
+from chunking import Chunker
+from ingestion import VisionAnalyzer, pdf_to_markdown, prepare_image
+from vision_cache import VisionCache
+from jobs import JobQueue, job_progress, run_worker
+from indexing import VectorIndexer, ChunkManifest
+from vector_store import PineconeStore, LocalVectorStore
+from storage import StorageClient, UploadTooLarge, iter_upload_file
+from pagination import projection, keyset, page, conditional_json
+from auth import TokenCache, OwnershipCache
+from embedding_cache import CachedEmbeddings, MemoryEmbeddingStore, RedisEmbeddingStore
+from logs import setup_logging, parse_sample_rates, request_id_var, user_id_var
+from metrics import (
+    REGISTRY, CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_IN_FLIGHT, TOKENS, LLM_IN_FLIGHT,
+    INGESTION_IN_FLIGHT, INGESTION_JOBS, STAGE_SECONDS, stage, enable_tracing
+)
 
 load_dotenv()
 
 app = FastAPI()
 
+logger = logging.getLogger("llm_service.api")
+http_logger = logging.getLogger("llm_service.http")
+ingestion_logger = logging.getLogger("llm_service.ingestion")
+
 @app.middleware("http")
 async def log_requests(request, call_next):
-    print(f"Request: {request.method} {request.url}")
+    # One structured line per request; the request id is attached to every log
+    # record written while handling it and echoed back in X-Request-ID
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    started = time.perf_counter()
+    status = 500
     try:
-        response = await call_next(request)
-        print(f"Response status: {response.status_code}")
+        with HTTP_IN_FLIGHT.track():
+            response = await call_next(request)
+        status = response.status_code
+        http_logger.info("Request handled", extra={
+            "method": request.method,
+            "path": request.url.path,
+            "status": status,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+        response.headers["X-Request-ID"] = request_id
         return response
-    except Exception as e:
-        print(f"Request failed: {str(e)}")
+    except Exception:
+        http_logger.exception("Request failed", extra={
+            "method": request.method,
+            "path": request.url.path,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
         raise
+    finally:
+        # Route template (/sessions/{session_id}), not the raw path, to keep label cardinality bounded.
+        # Streaming responses are measured to the response headers, not the end of the stream.
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status
+        ).observe(time.perf_counter() - started)
+        request_id_var.reset(token)
 
 # CORS
 allowed_origins_str = os.getenv("ALLOWED_ORIGINS", "")
@@ -54,6 +106,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paginated lists return the next cursor in a header
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Configuration
@@ -64,35 +118,190 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+EMBEDDING_CACHE_REDIS_URL = os.getenv("EMBEDDING_CACHE_REDIS_URL")
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.97"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "40"))
+HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "false").lower() == "true"
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+VISION_CACHE_ENABLED = os.getenv("VISION_CACHE_ENABLED", "true").lower() == "true"
+VISION_CACHE_MAX_MB = int(os.getenv("VISION_CACHE_MAX_MB", "256"))
+# Ingestion workers started inside the API process (0 when a separate worker.py container runs them)
+INGESTION_EMBEDDED_WORKERS = int(os.getenv("INGESTION_EMBEDDED_WORKERS", "1"))
+INGESTION_WORKER_CONCURRENCY = int(os.getenv("INGESTION_WORKER_CONCURRENCY", "2"))
+INGESTION_MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+STORAGE_BUCKET = os.getenv("STORAGE_BUCKET", "sb_oath1")
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "200"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Keep-probabilities for sub-WARNING records per logger, e.g. "llm_service.http=0.1"
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+# OpenTelemetry spans around chat/ingestion stages (needs opentelemetry-api; exporters via OTEL_* env)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+# Port worker.py serves /metrics on (the API serves it on its own port)
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+EMBEDDING_MODEL = "text-embedding-3-large"
+# Vector backend: "pinecone" (hosted) or "local" (NumPy index under DATA_DIR/vectors)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone").lower()
+# Optional local reranker for hybrid retrieval: "lexical" (no dependencies) or "cross-encoder"
+RERANKER = os.getenv("RERANKER", "lexical").lower()
+# Decoded-JWT LRU (0 disables) and session-ownership cache TTL (0 disables)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+SESSION_OWNER_TTL_SECONDS = float(os.getenv("SESSION_OWNER_TTL_SECONDS", "30"))
+# Orphan sweeper: vectors of deleted documents and leftover temp_images/ objects (0 disables)
+SWEEP_INTERVAL_SECONDS = int(os.getenv("SWEEP_INTERVAL_SECONDS", "3600"))
+TEMP_IMAGE_MAX_AGE_SECONDS = int(os.getenv("TEMP_IMAGE_MAX_AGE_SECONDS", "3600"))
+# Retrieval scope: "user" (own uploads only) or "shared" (all documents, one common knowledge base)
+RETRIEVAL_SCOPE = os.getenv("RETRIEVAL_SCOPE", "user").lower()
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+
+setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATES)
+if TRACING_ENABLED:
+    enable_tracing()
 
 # Clients
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise RuntimeError("Supabase credentials missing in .env")
 
-if not PINECONE_API_KEY or not PINECONE_INDEX_NAME:
-    print("Warning: Pinecone credentials missing in .env")
+if VECTOR_STORE == "pinecone" and (not PINECONE_API_KEY or not PINECONE_INDEX_NAME):
+    logger.warning("Pinecone credentials missing in .env")
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-llm = ChatOpenAI(api_key=OPENAI_API_KEY, model="gpt-4o-mini")
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
 
-# Initialize Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY)
+# Streaming (resumable) uploads and downloads; files never have to fit in memory
+storage = StorageClient(SUPABASE_URL, SUPABASE_KEY, STORAGE_BUCKET, max_upload_bytes=MAX_UPLOAD_MB * 1024 * 1024)
+llm = ChatOpenAI(api_key=OPENAI_API_KEY, model="gpt-4o-mini")
+# One chat client per model name, so requests reuse its HTTP connection pool. The model
+# comes from the request, so the dict is capped; past the cap clients are not kept
+chat_llms = {"gpt-4o-mini": llm}
+CHAT_LLMS_MAX = 16
+
+def chat_llm(model: str) -> ChatOpenAI:
+    client = chat_llms.get(model)
+    if client is None:
+        client = ChatOpenAI(api_key=OPENAI_API_KEY, model=model)
+        if len(chat_llms) < CHAT_LLMS_MAX:
+            chat_llms[model] = client
+    return client
+
+# Query embeddings go through an LRU/TTL cache; an optional Redis tier shares it across workers
+embedding_store = MemoryEmbeddingStore(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL_SECONDS)
+shared_embedding_store = None
+if EMBEDDING_CACHE_REDIS_URL:
+    import redis  # optional dependency, only needed when the shared tier is enabled
+    shared_embedding_store = RedisEmbeddingStore(
+        redis.Redis.from_url(EMBEDDING_CACHE_REDIS_URL),
+        EMBEDDING_CACHE_TTL_SECONDS
+    )
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(model=EMBEDDING_MODEL),
+    embedding_store,
+    shared_embedding_store
+)
 
-# import tiktoken  <-- Removed due to python 3.13 compatibility
+# Vision client for table/chart extraction during ingestion (bounded concurrency + retries)
+# Repeated images (logos, re-uploaded tables) are served from a persistent cache
+vision_cache = VisionCache(
+    os.path.join(DATA_DIR, "vision_cache.sqlite3"),
+    max_bytes=VISION_CACHE_MAX_MB * 1024 * 1024
+) if VISION_CACHE_ENABLED else None
+vision_analyzer = VisionAnalyzer(OPENAI_API_KEY, cache=vision_cache)
+
+# Durable document-analysis queue, shared with worker.py through DATA_DIR
+job_queue = JobQueue(os.path.join(DATA_DIR, "jobs.sqlite3"), max_attempts=INGESTION_MAX_ATTEMPTS)
+
+def collect_queue_depth():
+    for status, count in job_queue.depth().items():
+        INGESTION_JOBS.labels(status=status).set(count)
+
+REGISTRY.add_collector(collect_queue_depth)
+
+# One shared vector store for search, upserts and deletes
+if VECTOR_STORE == "local":
+    vector_store = LocalVectorStore(os.path.join(DATA_DIR, "vectors"))
+elif VECTOR_STORE == "pinecone":
+    if PINECONE_API_KEY and PINECONE_INDEX_NAME:
+        from pinecone import Pinecone  # only needed for the hosted backend
+        vector_store = PineconeStore(Pinecone(api_key=PINECONE_API_KEY).Index(PINECONE_INDEX_NAME))
+    else:
+        vector_store = None
+else:
+    raise RuntimeError(f"Unknown VECTOR_STORE: {VECTOR_STORE}")
 
-# Tokenizer Fallback
-# encoding = tiktoken.get_encoding("cl100k_base")
+# BM25 keyword index over the same chunks, fused with dense results (see retrieval.py)
+keyword_index = KeywordIndex(os.path.join(DATA_DIR, "keyword_index.sqlite3"))
 
-def count_tokens(text: str) -> int:
-    # Simple approximation: 1 token ~= 4 chars for English, varying for others.
-    # For now, this is enough to avoid 3.13 dependency issues.
-    return len(text) // 4
+if RERANKER == "cross-encoder":
+    reranker = CrossEncoderReranker(RERANKER_MODEL)
+elif RERANKER == "lexical":
+    reranker = LexicalReranker()
+else:
+    reranker = None
+
+# Long-lived retriever (one store handle, one query embedding per chat turn)
+retriever = Retriever(vector_store, embeddings, keyword_index, reranker) if vector_store else None
+
+# Token-budgeted, structure-aware chunking (budget counted with the embedding model's tokenizer)
+chunker = Chunker(lambda text: count_tokens(text, EMBEDDING_MODEL))
+
+# Batched, parallel embedding + upsert for ingestion
+chunk_manifest = ChunkManifest(os.path.join(DATA_DIR, "chunk_manifest.sqlite3"))
+vector_indexer = VectorIndexer(vector_store, embeddings, chunk_manifest, EMBEDDING_MODEL) if vector_store else None
+
+# Opt-in semantic answer cache (see response_cache.py), invalidated on corpus changes
+response_cache = SemanticResponseCache(
+    threshold=RESPONSE_CACHE_THRESHOLD,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS
+) if RESPONSE_CACHE_ENABLED else None
+
+# Per-session history window bounded by HISTORY_TOKEN_BUDGET; optional running summary
+history_manager = HistoryManager(
+    supabase,
+    count_tokens,
+    token_budget=HISTORY_TOKEN_BUDGET,
+    max_messages=HISTORY_MAX_MESSAGES,
+    summary_llm=llm if HISTORY_SUMMARY_ENABLED else None
+)
 
 class ChatRequest(BaseModel):
     message: str
     session_id: str
     model: str = "gpt-4o-mini"
+    # Per-request retrieval overrides (defaults: RETRIEVAL_* environment variables)
+    retrieval_mode: Optional[Literal["dense", "keyword", "hybrid"]] = None
+    top_k: Optional[int] = Field(None, ge=1, le=20)
+    rerank: Optional[bool] = None
+    mmr: Optional[bool] = None
+    # Restrict retrieval to these documents (still subject to RETRIEVAL_SCOPE)
+    document_ids: Optional[List[str]] = Field(None, max_length=100)
+
+def retrieval_filter(request: ChatRequest, user: dict):
+    # Vectors carry user_id/doc_id metadata; both indexes prefilter on these fields
+    conditions = []
+    if RETRIEVAL_SCOPE == "user":
+        conditions.append({"user_id": user["id"]})
+    if request.document_ids:
+        conditions.append({"doc_id": {"$in": list(request.document_ids)}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def retrieval_options(request: ChatRequest, user: dict) -> RetrievalOptions:
+    options = RetrievalOptions(filter=retrieval_filter(request, user))
+    if request.retrieval_mode is not None:
+        options.mode = request.retrieval_mode
+    if request.top_k is not None:
+        options.k = request.top_k
+    if request.rerank is not None:
+        options.rerank = request.rerank
+    if request.mmr is not None:
+        options.mmr = request.mmr
+    return options
 
 class CreateSessionRequest(BaseModel):
     title: str
@@ -100,149 +309,222 @@ class CreateSessionRequest(BaseModel):
 class RenameSessionRequest(BaseModel):
     title: str
 
-def verify_token(authorization: str = Header(None)):
+class BulkDeleteRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+# ids per PostgREST in.() filter, keeps request URLs well under proxy limits
+IN_FILTER_BATCH = 200
+
+def batched(items: list, size: int = IN_FILTER_BATCH):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+# Decoded tokens are cached until their exp; ownership checks for a short TTL (see auth.py)
+token_cache = TokenCache(JWT_SECRET, [ALGORITHM], max_entries=AUTH_TOKEN_CACHE_SIZE)
+ownership_cache = OwnershipCache(ttl_seconds=SESSION_OWNER_TTL_SECONDS)
+
+async def verify_token(authorization: str = Header(None)):
+    # Async so it runs on the event loop (no threadpool hop) and the user id set here is
+    # visible to the handler's log records
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization Header")
     try:
         token = authorization.split(" ")[1]
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
+        payload = token_cache.decode(token)
+        user_id_var.set(payload.get("id"))
         return payload
     except jwt.ExpiredSignatureError:
-        print("Token Verify Failed: ExpiredSignatureError")
+        logger.info("Token verify failed: expired")
         raise HTTPException(status_code=401, detail="Token Expired")
     except jwt.InvalidTokenError as e:
-        print(f"Token Verify Failed: InvalidTokenError - {e}")
+        logger.warning("Token verify failed: invalid token", extra={"error": str(e)})
         raise HTTPException(status_code=401, detail="Invalid Token")
-    except Exception as e:
-        print(f"Token Verify Failed: Unexpected Error - {e}")
+    except Exception:
+        logger.exception("Token verify failed: unexpected error")
         raise HTTPException(status_code=401, detail="Token Verification Failed")
 
+async def require_session(session_id: str, user: dict):
+    # 404 unless the session belongs to the user; confirmed pairs are cached briefly
+    if ownership_cache.owns(user["id"], session_id):
+        return
+    res = await execute(supabase.table("ChatSession").select("id").eq("id", session_id).eq("userId", user["id"]))
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Session not found or access denied")
+    ownership_cache.remember(user["id"], session_id)
+
 @app.post("/sessions")
 async def create_session(request: CreateSessionRequest, user: dict = Depends(verify_token)):
     try:
-        response = supabase.table("ChatSession").insert({
+        response = await execute(supabase.table("ChatSession").insert({
             "id": str(uuid.uuid4()),
             "userId": user["id"],
             "title": request.title
-        }).execute()
+        }))
         
         if response.data and len(response.data) > 0:
+             # The first chat turn in a new session needs no ownership lookup
+             ownership_cache.remember(user["id"], response.data[0]["id"])
              return response.data[0]
         return {"status": "error", "message": "Failed to create session"}
     except Exception as e:
-        print(f"Error creating session: {e}")
+        logger.exception("Error creating session")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Columns list endpoints may return (select with ?fields=a,b; id and createdAt always come back)
+SESSION_COLUMNS = ("id", "userId", "title", "createdAt")
+MESSAGE_COLUMNS = ("id", "sessionId", "role", "content", "tokenCount", "createdAt")
+# Storage paths stay server-side
+DOCUMENT_COLUMNS = ("id", "userId", "filename", "status", "createdAt", "updatedAt")
+
 @app.get("/sessions")
-async def get_sessions(user: dict = Depends(verify_token)):
+async def get_sessions(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    user: dict = Depends(verify_token)
+):
+    # Newest first, keyset-paginated (next page: X-Next-Cursor)
     try:
-        response = supabase.table("ChatSession").select("*")\
-            .eq("userId", user["id"])\
-            .order("createdAt", desc=True)\
-            .limit(20)\
-            .execute()
-        return response.data
+        query = supabase.table("ChatSession").select(projection(fields, SESSION_COLUMNS)).eq("userId", user["id"])
+        response = await execute(keyset(query, cursor, desc=True, limit=limit))
+        rows, next_cursor = page(response.data, limit)
+        return conditional_json(request, rows, next_cursor)
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        print(f"Error getting sessions: {e}")
+        logger.exception("Error getting sessions")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/sessions/{session_id}")
 async def update_session(session_id: str, request: RenameSessionRequest, user: dict = Depends(verify_token)):
     try:
-        response = supabase.table("ChatSession").update({
+        response = await execute(supabase.table("ChatSession").update({
             "title": request.title
-        }).eq("id", session_id).eq("userId", user["id"]).execute()
+        }).eq("id", session_id).eq("userId", user["id"]))
         
         if response.data:
             return response.data[0]
         return {"status": "error", "message": "Failed to update session"}
     except Exception as e:
-        print(f"Error updating session: {e}")
+        logger.exception("Error updating session")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def delete_session_batch(user_id: str, session_ids: list) -> list:
+    # One DELETE ... RETURNING scoped to the owner; messages go with their sessions through
+    # the ON DELETE CASCADE foreign key, in the same statement
+    try:
+        res = await execute(supabase.table("ChatSession").delete().in_("id", session_ids).eq("userId", user_id))
+    except APIError as e:
+        if e.code != "23503":
+            raise
+        # Foreign key without ON DELETE CASCADE (schema not migrated yet): delete the owned
+        # sessions' messages first
+        owned = await execute(supabase.table("ChatSession").select("id").in_("id", session_ids).eq("userId", user_id))
+        owned_ids = [row["id"] for row in owned.data]
+        if not owned_ids:
+            return []
+        await execute(supabase.table("ChatMessage").delete().in_("sessionId", owned_ids))
+        res = await execute(supabase.table("ChatSession").delete().in_("id", owned_ids).eq("userId", user_id))
+    return [row["id"] for row in res.data or []]
+
+async def delete_sessions(user_id: str, session_ids: list) -> list:
+    ownership_cache.forget(user_id, session_ids)
+    results = await asyncio.gather(*(delete_session_batch(user_id, batch) for batch in batched(session_ids)))
+    return [session_id for batch in results for session_id in batch]
+
 @app.delete("/sessions/{session_id}")
 async def delete_session(session_id: str, user: dict = Depends(verify_token)):
     try:
-        # First verify ownership (and existence)
-        session_res = supabase.table("ChatSession").select("id").eq("id", session_id).eq("userId", user["id"]).execute()
-        if not session_res.data:
+        # Ownership check, message cascade and delete in one round-trip
+        if not await delete_sessions(user["id"], [session_id]):
              raise HTTPException(status_code=404, detail="Session not found or access denied")
-
-        # Delete messages first (cascade simulation)
-        supabase.table("ChatMessage").delete().eq("sessionId", session_id).execute()
-        
-        # Delete session
-        supabase.table("ChatSession").delete().eq("id", session_id).execute()
-        
         return {"status": "deleted", "id": session_id}
     except HTTPException as he:
         raise he
     except Exception as e:
-        print(f"Error deleting session: {e}")
+        logger.exception("Error deleting session")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/sessions/bulk-delete")
+async def bulk_delete_sessions(request: BulkDeleteRequest, user: dict = Depends(verify_token)):
+    # Sessions that don't exist or belong to someone else are reported, not deleted
+    try:
+        ids = list(dict.fromkeys(request.ids))
+        deleted = await delete_sessions(user["id"], ids)
+        deleted_set = set(deleted)
+        return {"deleted": deleted, "not_found": [i for i in ids if i not in deleted_set]}
+    except Exception as e:
+        logger.exception("Error bulk deleting sessions")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/sessions/{session_id}/messages")
-async def get_messages(session_id: str, user: dict = Depends(verify_token)):
+async def get_messages(
+    session_id: str,
+    request: Request,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    order: Literal["asc", "desc"] = "asc",
+    fields: Optional[str] = None,
+    user: dict = Depends(verify_token)
+):
+    # order=desc pages backwards from the newest message (chat view: latest page first,
+    # older pages on demand); rows within a page follow `order`
+    await require_session(session_id, user)
     try:
-        response = supabase.table("ChatMessage").select("*")\
-            .eq("sessionId", session_id)\
-            .order("createdAt", desc=False)\
-            .execute()
-        return response.data
+        query = supabase.table("ChatMessage").select(projection(fields, MESSAGE_COLUMNS)).eq("sessionId", session_id)
+        response = await execute(keyset(query, cursor, desc=(order == "desc"), limit=limit))
+        rows, next_cursor = page(response.data, limit)
+        return conditional_json(request, rows, next_cursor)
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        print(f"Error getting messages: {e}")
+        logger.exception("Error getting messages")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/chat")
-async def chat(request: ChatRequest, user: dict = Depends(verify_token)):
+async def retrieve_context(request: ChatRequest, user: dict):
+    # Similarity Search (RAG) - Only perform if index name is set
+    if not retriever:
+        return "", None
     try:
-        # 1. Similarity Search (RAG) - Only perform if index name is set
-        context_text = ""
-        retrieved_docs = []
-        
-        if PINECONE_INDEX_NAME:
-            try:
-                # Initialize Vector Store
-                vectorstore = PineconeVectorStore(
-                    index_name=PINECONE_INDEX_NAME, 
-                    embedding=embeddings
-                )
-                
-                # Perform Search - Retrieve top 4 chunks
-                # We can filter by user_id if we decide to store it in metadata later for privacy
-                
-                # Get query vector for logging purposes
-                query_vector = embeddings.embed_query(request.message)
-                # Truncate vector display for readability (first 5 dims)
-                print(f"Query Vector (first 5 dims): {query_vector[:5]}...")
-
-                retrieved_docs = vectorstore.similarity_search(request.message, k=4)
-                
-                # Retrieve logs
-                print(f"--- Retrieved {len(retrieved_docs)} Chunks ---")
-                for i, doc in enumerate(retrieved_docs):
-                     print(f"Chunk {i+1} Source: {doc.metadata.get('filename')}")
-                     print(f"Chunk {i+1} Content Preview: {doc.page_content[:150]}...")
-                print("-----------------------------------")
-                
-                if retrieved_docs:
-                    context_text = "\n\n".join([d.page_content for d in retrieved_docs])
-                    
-            except Exception as vector_error:
-                print(f"Vector search failed (continuing without context): {vector_error}")
-
-        # 2. Fetch history for context
-        history_response = supabase.table("ChatMessage").select("*")\
-            .eq("sessionId", request.session_id)\
-            .order("createdAt", desc=False)\
-            .execute()
+        result = await retriever.search(request.message, retrieval_options(request, user))
+        retrieved_docs = result.docs
         
-        history_data = history_response.data
+        logger.info("Retrieved context", extra={
+            "chunks": len(retrieved_docs),
+            "sources": sorted({doc.metadata.get("filename") for doc in retrieved_docs}),
+        })
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, doc in enumerate(retrieved_docs):
+                logger.debug("Retrieved chunk", extra={
+                    "rank": i + 1,
+                    "source": doc.metadata.get("filename"),
+                    "preview": doc.page_content[:150],
+                })
         
-        # 3. Build message chain
-        system_instruction = "You are a helpful assistant."
-        if context_text:
-            system_instruction += f"""
+        context_text = "\n\n".join([d.page_content for d in retrieved_docs])
+        return context_text, result
+            
+    except Exception as vector_error:
+        logger.warning("Vector search failed (continuing without context)", extra={"error": str(vector_error)})
+        return "", None
+
+async def build_chat_messages(request: ChatRequest, user: dict):
+    # 1. Similarity Search (RAG) and 2. history fetch run concurrently
+    (context_text, retrieval), history = await asyncio.gather(
+        retrieve_context(request, user),
+        history_manager.load(request.session_id),
+    )
+    timings = dict(retrieval.timings) if retrieval else {}
+    timings.update(history.timings)
+    logger.info("Chat stage timings", extra={
+        "timings_ms": {k: round(v, 1) for k, v in timings.items()},
+        "history_tokens": history.tokens,
+    })
+    
+    # 3. Build message chain
+    system_instruction = "You are a helpful assistant."
+    if context_text:
+        system_instruction += f"""
 Use the following pieces of context to answer the user's question. 
 If the information is not in the context, just say that you don't know, don't try to make up an answer.
 Keep the answer concise.
@@ -250,174 +532,403 @@ Keep the answer concise.
 Context:
 {context_text}
 """
-            print("System prompt updated with context.")
 
-        messages = [
-            SystemMessage(content=system_instruction)
-        ]
-        
-        for msg in history_data:
-            if msg["role"] == "user":
-                messages.append(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "assistant":
-                messages.append(AIMessage(content=msg["content"]))
-                
-        # Add current user message
-        messages.append(HumanMessage(content=request.message))
-        
-        # 4. Invoke LLM with selected model
-        llm = ChatOpenAI(api_key=OPENAI_API_KEY, model=request.model)
-        response = llm.invoke(messages)
-        ai_content = response.content
-        
-        # Calculate tokens
-        user_tokens = count_tokens(request.message)
-        ai_tokens = count_tokens(ai_content)
-        
-        # 5. Save User Message
-        supabase.table("ChatMessage").insert({
-            "id": str(uuid.uuid4()),
-            "sessionId": request.session_id,
-            "role": "user",
-            "content": request.message,
-            "tokenCount": user_tokens
-        }).execute()
-        
-        # 6. Save AI Message
-        supabase.table("ChatMessage").insert({
+    messages = [
+        SystemMessage(content=system_instruction)
+    ]
+    if history.summary:
+        messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{history.summary}"))
+    
+    for msg in history.messages:
+        if msg["role"] == "user":
+            messages.append(HumanMessage(content=msg["content"]))
+        elif msg["role"] == "assistant":
+            messages.append(AIMessage(content=msg["content"]))
+            
+    # Add current user message
+    messages.append(HumanMessage(content=request.message))
+    return messages, retrieval, history
+
+def answer_scope(user: dict, history) -> str:
+    # Cached answers are only valid for the same conversation state: a digest of the
+    # history window (summary + messages sent to the LLM), plus the user when each
+    # user retrieves from their own documents
+    digest = hashlib.sha256()
+    if RETRIEVAL_SCOPE == "user":
+        digest.update(user["id"].encode("utf-8"))
+    digest.update(b"\0" + (history.summary or "").encode("utf-8"))
+    for msg in history.messages:
+        digest.update(f"\0{msg['role']}\0{msg['content']}".encode("utf-8"))
+    return digest.hexdigest()
+
+def cached_answer(request: ChatRequest, retrieval, scope: str):
+    # Only answers grounded in retrieved chunks are cacheable
+    if not response_cache or not retrieval or not retrieval.docs or retrieval.query_vector is None:
+        return None
+    return response_cache.lookup(retrieval.query_vector, [chunk_id(d) for d in retrieval.docs], request.model, scope)
+
+def remember_answer(request: ChatRequest, retrieval, answer: str, scope: str):
+    if not response_cache or not retrieval or not retrieval.docs or retrieval.query_vector is None or not answer:
+        return
+    response_cache.store(
+        retrieval.query_vector,
+        [chunk_id(d) for d in retrieval.docs],
+        {d.metadata.get("doc_id") for d in retrieval.docs},
+        request.model,
+        answer,
+        scope
+    )
+
+async def save_chat_turn(session_id: str, user_message: str, ai_content: str, model: str = None):
+    # Calculate tokens (BPE count for the model that produced the answer)
+    user_tokens = count_tokens(user_message, model)
+    ai_tokens = count_tokens(ai_content, model)
+    
+    # Save User Message
+    await execute(supabase.table("ChatMessage").insert({
+        "id": str(uuid.uuid4()),
+        "sessionId": session_id,
+        "role": "user",
+        "content": user_message,
+        "tokenCount": user_tokens
+    }))
+    
+    # Save AI Message (skipped if the stream was aborted before any token arrived)
+    if ai_content:
+        await execute(supabase.table("ChatMessage").insert({
             "id": str(uuid.uuid4()),
-            "sessionId": request.session_id,
+            "sessionId": session_id,
             "role": "assistant",
             "content": ai_content,
             "tokenCount": ai_tokens
-        }).execute()
+        }))
+    
+    return user_tokens, ai_tokens
+
+def record_token_usage(model: str, messages, ai_content: str):
+    # Prompt side covers the system prompt, retrieved context and history actually sent
+    TOKENS.labels(model=model, kind="prompt").inc(sum(count_tokens(m.content, model) for m in messages))
+    TOKENS.labels(model=model, kind="completion").inc(count_tokens(ai_content, model))
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat")
+async def chat(request: ChatRequest, user: dict = Depends(verify_token)):
+    await require_session(request.session_id, user)
+    try:
+        messages, retrieval, history = await build_chat_messages(request, user)
         
-        return {"response": ai_content, "user_tokens": user_tokens, "ai_tokens": ai_tokens}
+        # 4. Invoke LLM with selected model (async so the event loop stays free),
+        #    unless an equivalent question over the same chunks was already answered
+        scope = answer_scope(user, history)
+        ai_content = cached_answer(request, retrieval, scope)
+        cached = ai_content is not None
+        if not cached:
+            llm = chat_llm(request.model)
+            with stage("chat", "llm", model=request.model), LLM_IN_FLIGHT.labels(model=request.model).track():
+                response = await llm.ainvoke(messages)
+            ai_content = response.content
+            record_token_usage(request.model, messages, ai_content)
+            remember_answer(request, retrieval, ai_content, scope)
+        
+        # 5. Save User & AI Messages
+        with stage("chat", "save"):
+            user_tokens, ai_tokens = await save_chat_turn(request.session_id, request.message, ai_content, request.model)
+        spawn(history_manager.update_summary(request.session_id, history))
+        
+        return {"response": ai_content, "user_tokens": user_tokens, "ai_tokens": ai_tokens, "cached": cached}
+
+    except Exception as e:
+        logger.exception("Error in chat")
+        raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, user: dict = Depends(verify_token)):
+    # Same pipeline as /chat, but tokens are pushed to the client as Server-Sent Events.
+    # Events: "token" {"token"}, "done" {"user_tokens", "ai_tokens"}, "error" {"detail"}
+    await require_session(request.session_id, user)
+    try:
+        messages, retrieval, history = await build_chat_messages(request, user)
     except Exception as e:
-        print(f"Error in chat: {e}")
+        logger.exception("Error preparing chat stream")
         raise HTTPException(status_code=500, detail=str(e))
 
+    llm = chat_llm(request.model)
+    scope = answer_scope(user, history)
+    cached_content = cached_answer(request, retrieval, scope)
+
+    async def event_stream():
+        ai_parts = []
+        # Set once the turn has been handed to save_chat_turn (or must not be saved);
+        # the finally block saves a partial turn exactly once however the stream ends:
+        # CancelledError mid-await, or GeneratorExit when the client goes away while
+        # the generator is paused at a yield
+        saved = False
+        try:
+            try:
+                if cached_content is not None:
+                    ai_parts.append(cached_content)
+                    yield sse_event("token", {"token": cached_content})
+                else:
+                    # Timed by hand: a span can't stay current across the generator's yields
+                    started = time.perf_counter()
+                    first_token = None
+                    with LLM_IN_FLIGHT.labels(model=request.model).track():
+                        async for chunk in llm.astream(messages):
+                            if chunk.content:
+                                if first_token is None:
+                                    first_token = time.perf_counter()
+                                    STAGE_SECONDS.labels(pipeline="chat", stage="llm_first_token").observe(first_token - started)
+                                ai_parts.append(chunk.content)
+                                yield sse_event("token", {"token": chunk.content})
+                    STAGE_SECONDS.labels(pipeline="chat", stage="llm").observe(time.perf_counter() - started)
+                    record_token_usage(request.model, messages, "".join(ai_parts))
+                    remember_answer(request, retrieval, "".join(ai_parts), scope)
+            except (asyncio.CancelledError, GeneratorExit):
+                # Client went away: stop generating but keep whatever was produced (finally)
+                logger.info("Chat stream cancelled by client", extra={"session_id": request.session_id})
+                raise
+            except Exception as e:
+                logger.exception("Error in chat stream")
+                saved = True
+                yield sse_event("error", {"detail": str(e)})
+                return
+
+            try:
+                # Own task, shielded: a disconnect during the insert must not cut it short
+                saved = True
+                with stage("chat", "save"):
+                    user_tokens, ai_tokens = await asyncio.shield(
+                        spawn(save_chat_turn(request.session_id, request.message, "".join(ai_parts), request.model))
+                    )
+                spawn(history_manager.update_summary(request.session_id, history))
+                yield sse_event("done", {"user_tokens": user_tokens, "ai_tokens": ai_tokens, "cached": cached_content is not None})
+            except Exception as e:
+                logger.exception("Error saving streamed chat")
+                yield sse_event("error", {"detail": str(e)})
+        finally:
+            if not saved:
+                # Can't await here (the generator may be closing): run the insert as its own task
+                spawn(save_chat_turn(request.session_id, request.message, "".join(ai_parts), request.model))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Disable proxy buffering (nginx) so tokens reach the browser immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def new_storage_path(user_id: str, filename: str) -> str:
+    # Generate a unique path: userId/timestamp_uuid.ext
+    # We use UUID for storage path to avoid issues with non-ASCII filenames (InvalidKey error)
+    timestamp = int(datetime.datetime.now().timestamp())
+    file_ext = os.path.splitext(filename)[1] if filename else ""
+    return f"{user_id}/{timestamp}_{uuid.uuid4()}{file_ext}"
+
+async def store_upload(storage_path: str, chunks, length: int, content_type: str):
+    try:
+        await storage.upload_stream(storage_path, chunks, length, content_type)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as upload_error:
+        # If bucket doesn't exist or other error
+        logger.error("Storage upload error", extra={"error": str(upload_error)})
+        raise HTTPException(status_code=500, detail=f"Storage upload failed: {str(upload_error)}")
+
+async def create_document_record(user: dict, filename: str, storage_path: str):
+    doc_id = str(uuid.uuid4())
+    now_iso = datetime.datetime.now().isoformat()
+    db_res = await execute(supabase.table("Document").insert({
+        "id": doc_id,
+        "userId": user["id"],
+        "filename": filename,
+        "storagePath": storage_path,
+        "status": "pending",
+        "updatedAt": now_iso
+    }))
+
+    if db_res.data:
+        return db_res.data[0]
+
+    return {"status": "uploaded", "filename": filename}
+
 @app.post("/documents/upload")
 async def upload_document(file: UploadFile = File(...), user: dict = Depends(verify_token)):
     try:
-        # 1. Read file content
-        content = await file.read()
-        
-        # 2. Upload to Supabase Storage
-        # Generate a unique path: userId/timestamp_uuid.ext
-        # We use UUID for storage path to avoid issues with non-ASCII filenames (InvalidKey error)
-        timestamp = int(datetime.datetime.now().timestamp())
-        file_ext = os.path.splitext(file.filename)[1] if file.filename else ""
-        safe_filename = f"{timestamp}_{uuid.uuid4()}{file_ext}"
-        storage_path = f"{user['id']}/{safe_filename}"
-        
-        try:
-            res = supabase.storage.from_("sb_oath1").upload(
-                path=storage_path,
-                file=content,
-                file_options={"content-type": file.content_type}
-            )
-        except Exception as upload_error:
-            # If bucket doesn't exist or other error
-            print(f"Storage upload error: {upload_error}")
-            raise HTTPException(status_code=500, detail=f"Storage upload failed: {str(upload_error)}")
+        # 1. Size check (the multipart body is already spooled to disk, not held in memory)
+        size = file.size
+        if size is None:
+            # UploadFile.seek only takes an offset; seek the underlying file to its end
+            await run_blocking(file.file.seek, 0, os.SEEK_END)
+            size = await run_blocking(file.file.tell)
+
+        # 2. Stream to Supabase Storage in resumable chunks
+        storage_path = new_storage_path(user["id"], file.filename)
+        await store_upload(storage_path, iter_upload_file(file), size, file.content_type)
 
         # 3. Create DB Record
-        doc_id = str(uuid.uuid4())
-        now_iso = datetime.datetime.now().isoformat()
-        db_res = supabase.table("Document").insert({
-            "id": doc_id,
-            "userId": user["id"],
-            "filename": file.filename,
-            "storagePath": storage_path,
-            "status": "pending",
-            "updatedAt": now_iso
-        }).execute()
-        
-        if db_res.data:
-            return db_res.data[0]
-        
-        return {"status": "uploaded", "filename": file.filename}
+        return await create_document_record(user, file.filename, storage_path)
 
     except HTTPException as he:
         raise he
     except Exception as e:
-        print(f"Error uploading document: {e}")
+        logger.exception("Error uploading document")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/documents/upload/stream")
+async def upload_document_stream(request: Request, filename: str, user: dict = Depends(verify_token)):
+    # Raw request body (not multipart) piped to storage as it arrives, for large files:
+    #   curl -X POST -H "Authorization: Bearer ..." -H "Content-Type: application/pdf" \
+    #        --data-binary @big.pdf "/documents/upload/stream?filename=big.pdf"
+    try:
+        content_length = request.headers.get("content-length")
+        if content_length is None:
+            raise HTTPException(status_code=411, detail="Content-Length required")
+
+        storage_path = new_storage_path(user["id"], filename)
+        await store_upload(
+            storage_path,
+            request.stream(),
+            int(content_length),
+            request.headers.get("content-type")
+        )
+        return await create_document_record(user, filename, storage_path)
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.exception("Error uploading document")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def with_job_progress(documents):
+    # Attach the latest ingestion job's state (pages done / total, attempts) to each document
+    jobs = await run_blocking(job_queue.latest_for_docs, [d["id"] for d in documents])
+    for doc in documents:
+        job = jobs.get(doc["id"])
+        if job:
+            doc["progress"] = job_progress(job)
+    return documents
+
 @app.get("/documents")
-async def get_documents(user: dict = Depends(verify_token)):
+async def get_documents(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    user: dict = Depends(verify_token)
+):
+    # The caller's own uploads, newest first; served by the (userId, createdAt) index
     try:
-        response = supabase.table("Document").select("*")\
-            .order("createdAt", desc=True)\
-            .execute()
-        return response.data
+        query = supabase.table("Document").select(projection(fields, DOCUMENT_COLUMNS)).eq("userId", user["id"])
+        response = await execute(keyset(query, cursor, desc=True, limit=limit))
+        rows, next_cursor = page(response.data, limit)
+        return conditional_json(request, await with_job_progress(rows), next_cursor)
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        print(f"Error getting documents: {e}")
+        logger.exception("Error getting documents")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/documents/all")
-async def get_all_documents(user: dict = Depends(verify_token)):
+async def get_all_documents(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    user: dict = Depends(verify_token)
+):
     try:
-        # Fetch all documents, ordered by creation date
+        # The shared library, newest first (createdAt index)
         # Note: In a real app we might join with User table to get names, 
         # but for now we'll just return raw documents
-        response = supabase.table("Document").select("*")\
-            .order("createdAt", desc=True)\
-            .execute()
-        return response.data
+        query = supabase.table("Document").select(projection(fields, DOCUMENT_COLUMNS))
+        response = await execute(keyset(query, cursor, desc=True, limit=limit))
+        rows, next_cursor = page(response.data, limit)
+        return conditional_json(request, await with_job_progress(rows), next_cursor)
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        print(f"Error getting all documents: {e}")
+        logger.exception("Error getting all documents")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def purge_document_indexes(doc_ids: list):
+    # Vectors (one filter delete per batch), keyword postings and chunk manifests
+    if vector_store:
+        await asyncio.gather(*(
+            run_blocking(vector_store.delete, filter={"doc_id": {"$in": batch}}) for batch in batched(doc_ids)
+        ))
+    for doc_id in doc_ids:
+        await run_blocking(keyword_index.delete_document, doc_id)
+        await run_blocking(chunk_manifest.delete, doc_id)
+        # Cached answers built on this document are no longer valid
+        if response_cache:
+            response_cache.invalidate_document(doc_id)
+
+async def remove_storage_objects(paths: list):
+    bucket = supabase.storage.from_(STORAGE_BUCKET)
+    await asyncio.gather(*(run_blocking(bucket.remove, batch) for batch in batched(paths, 1000)))
+
+async def delete_documents(doc_ids: list, user_id: str) -> list:
+    # 1. Storage paths of the caller's documents (one select per batch); ids owned by
+    #    someone else are skipped like missing ones
+    results = await asyncio.gather(*(
+        execute(supabase.table("Document").select("id, storagePath").in_("id", batch).eq("userId", user_id))
+        for batch in batched(doc_ids)
+    ))
+    docs = [doc for res in results for doc in res.data or []]
+    if not docs:
+        return []
+    ids = [doc["id"] for doc in docs]
+
+    # 2. Index and storage cleanup run concurrently. Failures are logged and left to the
+    #    orphan sweeper, which collects vectors of documents whose row is gone
+    #    (storagePath includes "userId/filename", the storage key)
+    index_result, storage_result = await asyncio.gather(
+        purge_document_indexes(ids),
+        remove_storage_objects([doc["storagePath"] for doc in docs]),
+        return_exceptions=True
+    )
+    if isinstance(index_result, Exception):
+        logger.warning("Vector delete error (continuing)", extra={"doc_ids": ids, "error": str(index_result)})
+    if isinstance(storage_result, Exception):
+        logger.warning("Storage delete failed", extra={"doc_ids": ids, "error": str(storage_result)})
+
+    # 3. Delete the rows
+    await asyncio.gather(*(
+        execute(supabase.table("Document").delete().in_("id", batch).eq("userId", user_id)) for batch in batched(ids)
+    ))
+    logger.info("Deleted documents", extra={"doc_ids": ids})
+    return ids
+
 @app.delete("/documents/{doc_id}")
 async def delete_document(doc_id: str, user: dict = Depends(verify_token)):
     try:
-        # 1. Fetch document to get storage path
-        doc_res = supabase.table("Document").select("*").eq("id", doc_id).execute()
-        if not doc_res.data:
+        if not await delete_documents([doc_id], user["id"]):
             raise HTTPException(status_code=404, detail="Document not found")
-        
-        doc = doc_res.data[0]
-        
-        # 2. Delete from Pinecone
-        if PINECONE_INDEX_NAME:
-            try:
-                index = pc.Index(PINECONE_INDEX_NAME)
-                # Delete all vectors where metadata['doc_id'] == doc_id
-                index.delete(filter={"doc_id": doc_id})
-                print(f"Deleted vectors for doc_id: {doc_id}")
-            except Exception as pinecone_err:
-                 print(f"Pinecone delete error (continuing): {pinecone_err}")
-
-        # 3. Delete from Storage
-        # storagePath includes "userId/filename" which is the correct path for storage
-        try:
-            supabase.storage.from_("sb_oath1").remove([doc["storagePath"]])
-        except Exception as storage_err:
-             print(f"Storage delete warning: {storage_err}")
-             # Continue to delete DB record even if storage fails (or file missing)
-        
-        # 4. Delete from DB
-        supabase.table("Document").delete().eq("id", doc_id).execute()
-        
         return {"status": "deleted", "id": doc_id}
 
     except HTTPException as he:
         raise he
     except Exception as e:
-        print(f"Error deleting document: {e}")
+        logger.exception("Error deleting document")
         raise HTTPException(status_code=500, detail=str(e))
 
-import fitz  # PyMuPDF
-import base64
-from PIL import Image
+@app.post("/documents/bulk-delete")
+async def bulk_delete_documents(request: BulkDeleteRequest, user: dict = Depends(verify_token)):
+    try:
+        ids = list(dict.fromkeys(request.ids))
+        deleted = await delete_documents(ids, user["id"])
+        deleted_set = set(deleted)
+        return {"deleted": deleted, "not_found": [i for i in ids if i not in deleted_set]}
+    except Exception as e:
+        logger.exception("Error bulk deleting documents")
+        raise HTTPException(status_code=500, detail=str(e))
 
 # Helper to analyze full page image with GPT-4o-mini and get Markdown
 async def analyze_page_visual(image_bytes):
     try:
-        encoded_image = base64.b64encode(image_bytes).decode('utf-8')
+        image_url = await run_blocking(prepare_image, image_bytes)
         
         system_prompt = "You are a specialized document conversion AI."
         user_prompt = """Convert the provided document page image into clean, structured Markdown.
@@ -428,273 +939,269 @@ async def analyze_page_visual(image_bytes):
         message = HumanMessage(
             content=[
                 {"type": "text", "text": user_prompt},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded_image}"}}
+                {"type": "image_url", "image_url": {"url": image_url}}
             ]
         )
         
         response = await llm.ainvoke([message])
         return response.content
     except Exception as e:
-        print(f"Error analyzing page visual: {e}")
+        logger.exception("Error analyzing page visual")
         return ""
 
-async def process_document(doc_id: str, storage_path: str, filename: str):
+async def process_document(doc_id: str, storage_path: str, filename: str, user_id: str = None, progress=None):
+    # Raises on failure so the job queue can retry; the "error" status is set once it gives up
     try:
-        print(f"Processing document (Visual RAG): {doc_id}, {filename}")
+        ingestion_logger.info("Processing document", extra={"doc_id": doc_id, "doc_filename": filename})
         
         # 1. Update status to analyzing
-        supabase.table("Document").update({"status": "analyzing"}).eq("id", doc_id).execute()
+        await execute(supabase.table("Document").update({"status": "analyzing"}).eq("id", doc_id))
 
-        # 2. Download file from Supabase
-        file_bytes = supabase.storage.from_("sb_oath1").download(storage_path)
-        
-        # 3. Visual Extraction Pipeline
-        texts = []
-        metadatas = []
-        
+        # 2. Stream the file from Supabase straight to a temp file; PyMuPDF workers open
+        # it by path, so the document is never held in memory as a whole
         file_ext = os.path.splitext(filename)[1].lower()
-        full_text_content = ""
-        
-        if file_ext == ".pdf":
-            # Save bytes to temp file for fitz
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(file_bytes)
-                tmp_path = tmp.name
-
-            # Implement Hybrid Approach: Fitz for Text + OpenAI Vision for Images
-            try:
-                print(f"Starting Hybrid Processing for {filename}...")
-                doc = fitz.open(tmp_path)
-                final_markdown_parts = []
-                
-                # We need a separate OpenAI client for direct API calls
-                # using the same key as the langchain model
-                from openai import OpenAI
-                openai_client = OpenAI(api_key=OPENAI_API_KEY)
-
-                for page_num, page in enumerate(doc):
-                    print(f"Processing page {page_num + 1}...")
-                    page_dict = page.get_text("dict")
-                    blocks = page_dict["blocks"]
-                    # Sort blocks by vertical position (top/y0) to ensure correct reading order
-                    # block structure: [x0, y0, x1, y1, ...] or dictionary with "bbox"
-                    # page.get_text("dict") returns blocks with "bbox": (x0, y0, x1, y1)
-                    blocks.sort(key=lambda b: b["bbox"][1])
-
-                    
-                    page_content = []
-
-                    for block in blocks:
-                        # 1. Text Block
-                        if block["type"] == 0:
-                            text_content = ""
-                            for line in block["lines"]:
-                                for span in line["spans"]:
-                                    text_content += span["text"]
-                            if text_content.strip():
-                                print(f"   [Text Block Extracted]: {len(text_content)} chars")
-                                print(f"   Preview: {text_content[:50]}...")
-                                page_content.append(text_content + "\n")
-
-                        # 2. Image Block
-                        elif block["type"] == 1:
-                            print(f"   [Image Block Found] Analyzing with Vision...")
-                            image_bytes = block["image"]
-                            
-                            # Upload to Supabase Storage to get public URL
-                            try:
-                                # Generate unique path
-                                # Using a specific folder for temp images
-                                img_filename = f"temp_vision_{uuid.uuid4()}.png"
-                                img_path = f"temp_images/{img_filename}"
-                                
-                                # Upload
-                                supabase.storage.from_("sb_oath1").upload(
-                                    path=img_path,
-                                    file=image_bytes,
-                                    file_options={"content-type": "image/png"}
-                                )
-                                
-                                # Use Signed URL because bucket might not be Public
-                                # Expires in 60 seconds (enough for OpenAI to download)
-                                signed_url_res = supabase.storage.from_("sb_oath1").create_signed_url(img_path, 60)
-                                
-                                # Check the structure of signed_url_res
-                                # It typically returns a dict: {'signedURL': '...'} or pure string depending on version.
-                                # Let's handle both.
-                                if isinstance(signed_url_res, dict) and 'signedURL' in signed_url_res:
-                                    image_url = signed_url_res['signedURL']
-                                elif isinstance(signed_url_res, str):
-                                    image_url = signed_url_res
-                                else:
-                                    # Fallback
-                                    print(f"   [Warning] Unexpected signed url response: {signed_url_res}")
-                                    image_url = str(signed_url_res)
-
-                                if isinstance(image_url, str):
-                                    image_url = image_url.strip()
-
-
-
-                                
-                                # Call GPT-4o-mini Vision with Structural Inference Prompt
-                                response = openai_client.chat.completions.create(
-                                    model="gpt-4o-mini",
-                                    messages=[
-                                        {
-                                            "role": "system",
-                                            "content": (
-                                                "You are a professional document digitizer. Your mission is to extract tables with 100% completeness, "
-                                                "ensuring no rows are omitted from the bottom of the image."
-                                            )
-                                        },
-                                        {
-                                            "role": "user",
-                                            "content": [
-                                                {
-                                                    "type": "text", 
-                                                    "text": (
-                                                        "Extract the table from this image into Markdown by following these structural rules:\n\n"
-                                                        "1. **Full Image Scan**: Process the image from the very top header to the very last row at the bottom (e.g., '10억원 초과'). DO NOT stop until the entire table is transcribed.\n"
-                                                        "2. **Analyze Vertical Alignment**: Determine columns based on strict vertical alignment. "
-                                                        "Do not create new columns unless there is a clear, consistent vertical gap or divider.\n"
-                                                        "3. **Cell Consolidation**: If a single cell contains multiple lines of text (e.g., range values), "
-                                                        "keep them within the same Markdown cell. Use `<br>` for line breaks inside the cell instead of splitting them into new rows or columns.\n"
-                                                        "4. **Literal Transcription**: Transcribe every number, symbol, and word exactly as shown. Do not summarize or omit any data.\n"
-                                                        "5. **No Conversational Filler**: Output ONLY the Markdown table or content.\n\n"
-                                                        "For charts or diagrams, provide a structured nested list."
-                                                        "6. **Row Alignment**: Stacked text within a visual row belongs to the SAME cell. Join them with a space or `<br>` within that single cell. Do not shift them into the next row or a new column.\n"
-                                                        "7. **Output**: Provide ONLY the Markdown table. No headers like 'Here is the table'."
-                                                    )
-                                                },
-                                                {"type": "image_url", "image_url": {"url": image_url}}
-                                            ],
-                                        }
-                                    ],
-                                    max_tokens=2000,
-                                    temperature=0.0,
-                                )
-                                img_markdown = response.choices[0].message.content
-                                print(f"   [Vision Analysis Result]: {len(img_markdown)} chars")
-                                print(f"   Preview: {img_markdown[:50]}...")
-                                page_content.append(f"\n> **Image Analysis**:\n{img_markdown}\n")
-                                
-                                # Cleanup image immediately? Or let policies handle it?
-                                # Ideally delete to save space
-                                supabase.storage.from_("sb_oath1").remove([img_path])
-                                
-                            except Exception as img_err:
-                                print(f"Image processing failed: {img_err}")
-                                # specific error handling if needed
-                    
-                    final_markdown_parts.append("\n".join(page_content))
-
-                doc.close()
-                full_markdown_content = "\n\n---\n\n".join(final_markdown_parts)
-                print(f"Hybrid processing completed. extracted {len(full_markdown_content)} chars.")
-                
-            except Exception as hybrid_err:
-                print(f"Hybrid processing error: {hybrid_err}")
-                raise hybrid_err
-            finally:
-                 if os.path.exists(tmp_path):
-                     try:
-                        os.unlink(tmp_path)
-                     except:
-                        pass
-
-        else:
-            # Assume plain text/markdown for non-PDFs
-            full_markdown_content = file_bytes.decode("utf-8")
+        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
+            tmp_path = tmp.name
+        try:
+            with stage("ingestion", "download"), open(tmp_path, "wb") as dest:
+                size = await storage.download_to(storage_path, dest)
+            ingestion_logger.info("Downloaded document", extra={"doc_id": doc_id, "bytes": size})
+
+            # 3. Visual Extraction Pipeline
+            if file_ext == ".pdf":
+                # Implement Hybrid Approach: Fitz for Text + OpenAI Vision for Images
+                # (pages extracted in a process pool, image blocks analyzed concurrently)
+                try:
+                    vision_stats = {"images": 0, "cache_hits": 0, "vision_calls": 0}
+                    page_markdowns = await pdf_to_markdown(
+                        tmp_path,
+                        lambda image_bytes: vision_analyzer.describe(image_bytes, vision_stats),
+                        progress=progress
+                    )
+                    full_markdown_content = "\n\n---\n\n".join(page_markdowns)
+                    ingestion_logger.info("Hybrid extraction completed", extra={
+                        "doc_id": doc_id,
+                        "pages": len(page_markdowns),
+                        "chars": len(full_markdown_content),
+                        **vision_stats,
+                    })
+
+                except Exception as hybrid_err:
+                    ingestion_logger.error("Hybrid extraction failed", extra={"doc_id": doc_id, "error": str(hybrid_err)})
+                    raise hybrid_err
+
+            else:
+                # Assume plain text/markdown for non-PDFs
+                with open(tmp_path, "rb") as f:
+                    full_markdown_content = (await run_blocking(f.read)).decode("utf-8")
+                page_markdowns = [full_markdown_content]
+                if progress:
+                    progress(1, 1)
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.unlink(tmp_path)
+                except:
+                    pass
 
         if not full_markdown_content.strip():
              raise ValueError("No content extracted from document")
 
-        print("----------------------------------------------------------------")
-        print(" [FINAL MERGED MARKDOWN (Text + Vision)] ")
-        print("----------------------------------------------------------------")
-        print(full_markdown_content)
-        print("----------------------------------------------------------------")
-        print(" [END RAW MARKDOWN] ")
-        print("----------------------------------------------------------------")
-
-        # Convert Markdown to Plain Text (User requested workflow)
-        print("Converting Markdown to Plain Text...")
-        try:
-            html_content = markdown.markdown(full_markdown_content)
-            soup = BeautifulSoup(html_content, "html.parser")
-            full_text_content = soup.get_text()
-            print(f"Text conversion completed. Length: {len(full_text_content)} chars")
-            
-            print("----------------------------------------------------------------")
-            print(" [CONVERTED TEXT CONTENT] ")
-            print("----------------------------------------------------------------")
-            print(full_text_content)
-            print("----------------------------------------------------------------")
-            print(" [END CONVERTED TEXT] ")
-            print("----------------------------------------------------------------")
-
-        except Exception as md_err:
-            print(f"Markdown to text conversion failed: {md_err}")
-            # Fallback to original content
-            full_text_content = full_markdown_content
-
-        # 4. Chunking (Text Optimized as per request)
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1500,
-            chunk_overlap=100,
-            separators=["\n\n", "\n"]
-        )
-        texts = text_splitter.split_text(full_text_content)
-        
-        print(f"Split into {len(texts)} chunks")
-        for i, t in enumerate(texts):
-            preview = t[:100].replace('\n', ' ')
-            print(f"Chunk {i+1} Preview: {preview}...")
-
-        # 5. Embed & Upsert to Pinecone
-        metadatas = [{"doc_id": doc_id, "filename": filename, "text": t, "type": "markdown"} for t in texts]
+        # Full-document dumps only at DEBUG (megabytes per document otherwise)
+        ingestion_logger.debug("Merged Markdown", extra={"doc_id": doc_id, "markdown": full_markdown_content})
+
+        # 4. Structure-aware chunking: one pass over the pages, token-bounded chunks along
+        # heading/table/page boundaries, each with its page span and section path
+        with stage("ingestion", "chunk"):
+            chunks = await run_blocking(chunker.chunk_pages, page_markdowns)
+        texts = [chunk.text for chunk in chunks]
+
+        ingestion_logger.info("Split document", extra={
+            "doc_id": doc_id,
+            "chunks": len(chunks),
+            "tokens": sum(chunk.tokens for chunk in chunks),
+        })
+        if ingestion_logger.isEnabledFor(logging.DEBUG):
+            for i, chunk in enumerate(chunks):
+                ingestion_logger.debug("Chunk preview", extra={
+                    "doc_id": doc_id, "chunk": i + 1, "page": chunk.page, "section": chunk.section,
+                    "preview": chunk.text[:100],
+                })
+
+        # 5. Embed & Upsert to the vector store
+        # "text" is the chunk body the retriever reads back (stored once, as the text key)
+        metadatas = [
+            {
+                "doc_id": doc_id,
+                "user_id": user_id,
+                "filename": filename,
+                "text": chunk.text,
+                "type": "markdown",
+                "page": chunk.page,
+                "page_end": chunk.page_end,
+                "section": chunk.section,
+            }
+            for chunk in chunks
+        ]
         
-        print(f"Upserting {len(texts)} chunks to Pinecone...")
-        
-        PineconeVectorStore.from_texts(
-            texts=texts,
-            embedding=embeddings,
-            metadatas=metadatas,
-            index_name=PINECONE_INDEX_NAME
-        )
+        if not vector_indexer:
+            raise RuntimeError("Vector store is not configured")
+        with stage("ingestion", "index"):
+            index_stats = await vector_indexer.index_document(doc_id, texts, metadatas)
+        TOKENS.labels(model=EMBEDDING_MODEL, kind="embedding").inc(index_stats["tokens"])
+        with stage("ingestion", "keyword_index"):
+            await run_blocking(keyword_index.index_document, doc_id, texts, metadatas)
         
         # 6. Update status to completed
-        supabase.table("Document").update({"status": "completed"}).eq("id", doc_id).execute()
-        print(f"Document {doc_id} processing completed")
+        await execute(supabase.table("Document").update({"status": "completed"}).eq("id", doc_id))
+        # Re-analysis replaces this document's chunks, so drop answers built on the old ones
+        if response_cache:
+            response_cache.invalidate_document(doc_id)
+        ingestion_logger.info("Document processing completed", extra={"doc_id": doc_id})
+
+    except Exception:
+        ingestion_logger.exception("Error processing document", extra={"doc_id": doc_id})
+        raise
 
-    except Exception as e:
-        print(f"Error processing document {doc_id}: {e}")
-        supabase.table("Document").update({"status": "error"}).eq("id", doc_id).execute()
+async def run_ingestion_job(job: dict, progress):
+    payload = job["payload"]
+    with INGESTION_IN_FLIGHT.track(), stage("ingestion", "document", doc_id=job["doc_id"]):
+        # Jobs queued before user_id was in the payload: storage paths start with the owner's id
+        user_id = payload.get("user_id") or payload["storage_path"].split("/", 1)[0]
+        await process_document(job["doc_id"], payload["storage_path"], payload["filename"], user_id, progress=progress)
+
+def ingestion_payload(doc: dict) -> dict:
+    return {"storage_path": doc["storagePath"], "filename": doc["filename"], "user_id": doc["userId"]}
+
+async def mark_document_failed(job: dict):
+    await execute(supabase.table("Document").update({"status": "error"}).eq("id", job["doc_id"]))
+
+async def requeue_orphaned_documents():
+    # Documents left in "analyzing" without a live job (e.g. a crash before the queue
+    # existed, or a lost queue volume) are queued again instead of hanging forever
+    res = await execute(supabase.table("Document").select("id, userId, storagePath, filename").eq("status", "analyzing"))
+    for doc in res.data or []:
+        if not await run_blocking(job_queue.has_active_job, doc["id"]):
+            await run_blocking(job_queue.enqueue, doc["id"], ingestion_payload(doc))
+            ingestion_logger.warning("Re-queued orphaned analysis", extra={"doc_id": doc["id"]})
+
+async def start_ingestion_workers(concurrency: int):
+    await requeue_orphaned_documents()
+    await run_worker(job_queue, run_ingestion_job, mark_document_failed, concurrency=concurrency)
+
+async def watch_completed_jobs(poll_seconds: float = 5.0):
+    # Jobs may finish in another process; drop cached answers for re-indexed documents
+    since = time.time()
+    while True:
+        await asyncio.sleep(poll_seconds)
+        try:
+            for doc_id, updated_at in await run_blocking(job_queue.completed_since, since):
+                response_cache.invalidate_document(doc_id)
+                since = max(since, updated_at)
+        except Exception:
+            logger.exception("Completed-job watcher error")
+
+async def remove_temp_images() -> int:
+    # Older service versions uploaded vision crops under temp_images/ and could leave them
+    # behind on a crash; nothing writes there any more
+    bucket = supabase.storage.from_(STORAGE_BUCKET)
+    cutoff = time.time() - TEMP_IMAGE_MAX_AGE_SECONDS
+    stale, offset = [], 0
+    while True:
+        objects = await run_blocking(bucket.list, "temp_images", {"limit": 1000, "offset": offset})
+        if not objects:
+            break
+        for obj in objects:
+            created = obj.get("created_at")
+            if created and datetime.datetime.fromisoformat(created.replace("Z", "+00:00")).timestamp() < cutoff:
+                stale.append(f"temp_images/{obj['name']}")
+        offset += len(objects)
+    if stale:
+        await remove_storage_objects(stale)
+    return len(stale)
+
+async def sweep_orphans():
+    # 1. Indexed documents whose Document row is gone (deleted mid-analysis, or a
+    #    cleanup step that failed during delete)
+    known = set(await run_blocking(chunk_manifest.doc_ids)) | set(await run_blocking(keyword_index.doc_ids))
+    existing = set()
+    for batch in batched(sorted(known)):
+        res = await execute(supabase.table("Document").select("id").in_("id", batch))
+        existing.update(row["id"] for row in res.data or [])
+    orphans = sorted(known - existing)
+    if orphans:
+        await purge_document_indexes(orphans)
+
+    # 2. Leftover temp_images/ objects
+    temp_images = await remove_temp_images()
+    logger.info("Orphan sweep finished", extra={"orphaned_documents": len(orphans), "temp_images": temp_images})
+
+async def run_sweeper(interval_seconds: float = SWEEP_INTERVAL_SECONDS):
+    while True:
+        try:
+            await sweep_orphans()
+        except Exception:
+            logger.exception("Orphan sweep error")
+        await asyncio.sleep(interval_seconds)
+
+@app.on_event("startup")
+async def start_background_loops():
+    if INGESTION_EMBEDDED_WORKERS > 0:
+        spawn(start_ingestion_workers(INGESTION_EMBEDDED_WORKERS))
+        # With a separate worker.py, the sweeper runs there instead
+        if SWEEP_INTERVAL_SECONDS > 0:
+            spawn(run_sweeper())
+    if response_cache:
+        spawn(watch_completed_jobs())
 
 
 @app.post("/documents/{doc_id}/analyze")
-async def analyze_document(doc_id: str, background_tasks: BackgroundTasks, user: dict = Depends(verify_token)):
+async def analyze_document(doc_id: str, user: dict = Depends(verify_token)):
     try:
-        # Fetch document
-        doc_res = supabase.table("Document").select("*").eq("id", doc_id).execute()
+        # Fetch document (the caller's own only, like deletes)
+        doc_res = await execute(supabase.table("Document").select("*").eq("id", doc_id).eq("userId", user["id"]))
         if not doc_res.data:
              raise HTTPException(status_code=404, detail="Document not found")
         
         doc = doc_res.data[0]
         
-        if doc["status"] == "analyzing":
+        if doc["status"] == "analyzing" and await run_blocking(job_queue.has_active_job, doc_id):
             return {"message": "Document is already being analyzed"}
         
-        # Start background task
-        background_tasks.add_task(process_document, doc["id"], doc["storagePath"], doc["filename"])
+        # Mark it analyzing before queueing: a worker may claim and finish the job before
+        # a later update would land, overwriting "completed"
+        await execute(supabase.table("Document").update({"status": "analyzing"}).eq("id", doc_id))
+
+        # Queue a durable job; a worker (embedded or worker.py) picks it up
+        try:
+            job = await run_blocking(job_queue.enqueue, doc["id"], ingestion_payload(doc))
+        except Exception:
+            await execute(supabase.table("Document").update({"status": "error"}).eq("id", doc_id))
+            raise
         
-        return {"message": "Analysis started", "status": "analyzing"}
+        return {"message": "Analysis started", "status": "analyzing", "job_id": job["id"]}
 
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        print(f"Error triggering analysis: {e}")
+        logger.exception("Error triggering analysis")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus scrape endpoint (blocked at the public nginx proxy; scrape llm_service:8000 directly)
+    await run_blocking(REGISTRY.collect)
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/cache/stats")
+async def get_cache_stats(user: dict = Depends(verify_token)):
+    stats = {"embeddings": embeddings.stats(), "tokens": token_cache.stats(), "session_owners": ownership_cache.stats()}
+    if vision_cache:
+        stats["vision"] = await run_blocking(vision_cache.stats)
+    if response_cache:
+        stats["responses"] = response_cache.stats()
+    return stats
+
 @app.get("/")
 def health_check():
     return {"status": "ok"}
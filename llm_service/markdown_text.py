@@ -0,0 +1,109 @@
+import re
+import html
+
+# Single-pass Markdown -> plain-text blocks for chunking (chunking.py). Replaces rendering
+# to HTML with `markdown` and re-parsing with BeautifulSoup: one regex pass per line, no
+# tree, and table rows survive as one "cell | cell | cell" line each instead of being
+# shredded into one cell per line. Works on any iterable of lines, so pages can be
+# converted independently (and lazily) as they come out of extraction.
+
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_RULE = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_BLOCKQUOTE = re.compile(r"^\s{0,3}(>\s?)+")
+_BULLET = re.compile(r"^(\s*)[*+-]\s+")
+_CELL_SPLIT = re.compile(r"(?<!\\)\|")
+
+_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_CODE = re.compile(r"`([^`]+)`")
+_STRONG = re.compile(r"(\*\*|__)(?=\S)(.+?)(?<=\S)\1")
+_EM_STAR = re.compile(r"(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*(?![\w*])")
+_EM_UNDERSCORE = re.compile(r"(?<![\w_])_(?=\S)(.+?)(?<=\S)_(?![\w_])")
+_BR = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_TAG = re.compile(r"</?[A-Za-z][^>]*>")
+_ESCAPE = re.compile(r"\\([\\`*_{}\[\]()#+\-.!|>~])")
+
+def inline_text(text: str) -> str:
+    if "!" in text:
+        text = _IMAGE.sub(r"\1", text)
+    if "[" in text:
+        text = _LINK.sub(r"\1", text)
+    if "`" in text:
+        text = _CODE.sub(r"\1", text)
+    if "*" in text or "_" in text:
+        text = _STRONG.sub(r"\2", text)
+        text = _EM_STAR.sub(r"\1", text)
+        text = _EM_UNDERSCORE.sub(r"\1", text)
+    if "<" in text:
+        text = _TAG.sub("", _BR.sub(" ", text))
+    if "&" in text:
+        text = html.unescape(text)
+    if "\\" in text:
+        text = _ESCAPE.sub(r"\1", text)
+    return text
+
+def is_table_row(line: str) -> bool:
+    stripped = line.strip()
+    return stripped.startswith("|") and stripped.endswith("|") and len(stripped) > 1
+
+def table_row_text(line: str) -> str:
+    cells = _CELL_SPLIT.split(line.strip().strip("|"))
+    return " | ".join(inline_text(cell.strip()) for cell in cells)
+
+def iter_blocks(lines):
+    """Groups Markdown lines into ("heading", (level, text)) / ("paragraph", text) /
+    ("table", [row_text, ...]) / ("code", text) blocks."""
+    paragraph = []
+    table = []
+    code = None
+
+    def close():
+        if paragraph:
+            yield "paragraph", "\n".join(paragraph)
+            paragraph.clear()
+        if table:
+            yield "table", list(table)
+            table.clear()
+
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if _FENCE.match(line):
+            if code is None:
+                yield from close()
+                code = []
+            else:
+                if code:
+                    yield "code", "\n".join(code)
+                code = None
+            continue
+        if code is not None:
+            code.append(line)
+            continue
+        if ">" in line:
+            line = _BLOCKQUOTE.sub("", line)
+        if not line.strip() or _RULE.match(line):
+            yield from close()
+            continue
+        if _TABLE_SEPARATOR.match(line):
+            continue
+        if is_table_row(line):
+            if paragraph:
+                yield "paragraph", "\n".join(paragraph)
+                paragraph.clear()
+            table.append(table_row_text(line))
+            continue
+        if table:
+            yield "table", list(table)
+            table.clear()
+        heading = _HEADING.match(line)
+        if heading:
+            yield from close()
+            yield "heading", (len(heading.group(1)), inline_text(heading.group(2)))
+            continue
+        paragraph.append(inline_text(_BULLET.sub(r"\1- ", line)))
+
+    if code:
+        yield "code", "\n".join(code)
+    yield from close()
@@ -0,0 +1,255 @@
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+
+from io_pool import run_blocking
+
+logger = logging.getLogger("llm_service.metrics")
+
+# Minimal Prometheus text-format metrics (counters, gauges, histograms with labels)
+# plus optional OpenTelemetry spans around pipeline stages.
+#
+#   with stage("chat", "llm", model=model):
+#       response = await llm.ainvoke(messages)
+#
+# records llm_stage_duration_seconds{pipeline="chat",stage="llm"} and, when tracing is
+# enabled, a "chat.llm" span carrying the keyword arguments as attributes.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            # Unlabelled metrics are exported (as 0) before their first update
+            self.labels()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _default(self):
+        # Unlabelled metrics are used directly: COUNTER.inc()
+        return self.labels()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in sorted(children):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+    @contextmanager
+    def track(self):
+        # In-flight gauge: incremented for the duration of the block
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def track(self):
+        return self._default().track()
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def _render_child(self, key, child):
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn):
+        # Called before each scrape to refresh gauges computed from other state (queue depth)
+        self._collectors.append(fn)
+
+    def collect(self):
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception as e:
+                logger.warning("Metrics collector failed", extra={"error": str(e)})
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "llm_http_request_duration_seconds", "HTTP request latency by route (time to response headers).",
+    ["method", "route", "status"]
+))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "llm_http_requests_in_flight", "HTTP requests currently being handled."
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "llm_stage_duration_seconds", "Duration of chat and ingestion pipeline stages.",
+    ["pipeline", "stage"], buckets=STAGE_BUCKETS
+))
+TOKENS = REGISTRY.register(Counter(
+    "llm_tokens_total", "Tokens processed, by model and kind (prompt, completion, embedding).",
+    ["model", "kind"]
+))
+LLM_IN_FLIGHT = REGISTRY.register(Gauge(
+    "llm_model_calls_in_flight", "Chat model calls currently in progress.", ["model"]
+))
+INGESTION_IN_FLIGHT = REGISTRY.register(Gauge(
+    "llm_ingestion_documents_in_flight", "Documents currently being processed by this process."
+))
+INGESTION_JOBS = REGISTRY.register(Gauge(
+    "llm_ingestion_jobs", "Ingestion jobs in the durable queue, by status.", ["status"]
+))
+
+_tracer = None
+
+def enable_tracing(service_name: str = "llm_service"):
+    """Wraps stages in OpenTelemetry spans. Exporters are configured the usual way
+    (opentelemetry-instrument / OTEL_* environment variables)."""
+    global _tracer
+    from opentelemetry import trace  # optional dependency, only needed when tracing is enabled
+    _tracer = trace.get_tracer(service_name)
+
+@contextmanager
+def stage(pipeline: str, name: str, **attributes):
+    span = _tracer.start_as_current_span(f"{pipeline}.{name}", attributes=attributes) if _tracer else nullcontext()
+    started = time.perf_counter()
+    with span:
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.labels(pipeline=pipeline, stage=name).observe(time.perf_counter() - started)
+
+async def serve_metrics(port: int, host: str = "0.0.0.0"):
+    # Bare-bones scrape endpoint for processes without an HTTP app (worker.py)
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            await run_blocking(REGISTRY.collect)
+            body = REGISTRY.render().encode("utf-8")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                + f"Content-Type: {CONTENT_TYPE}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii")
+                + body
+            )
+            await writer.drain()
+        except Exception:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info("Serving metrics", extra={"port": port})
+    async with server:
+        await server.serve_forever()
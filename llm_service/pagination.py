@@ -0,0 +1,89 @@
+import gzip
+import json
+import base64
+import hashlib
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+# Keyset pagination, column projection and conditional (ETag) / gzip JSON responses for
+# the list endpoints (sessions, messages, documents).
+#
+# Pages are ordered by (createdAt, id) and a cursor is the opaque (createdAt, id) of the
+# last row of the previous page, so each page is one index range scan however deep the
+# client pages, and rows inserted meanwhile don't shift later pages. Bodies stay plain
+# JSON arrays; the next page's cursor travels in the X-Next-Cursor header (absent on the
+# last page).
+
+GZIP_MIN_BYTES = 1024
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["createdAt"], row["id"]], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return str(created_at), str(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def projection(fields: str, allowed: tuple) -> str:
+    """select() list for a comma-separated `fields` parameter (default: all allowed
+    columns). id and createdAt are always included, the cursor is built from them."""
+    if not fields:
+        return ", ".join(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    columns = ["id", "createdAt"] + [f for f in requested if f not in ("id", "createdAt")]
+    return ", ".join(columns)
+
+def keyset(query, cursor: str = None, desc: bool = True, limit: int = 50):
+    # Rows strictly after the cursor in (createdAt, id) order; one extra row tells
+    # whether there is a next page. Values are quoted: timestamps contain ':' and '.'
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        op = "lt" if desc else "gt"
+        query = query.or_(f'createdAt.{op}."{created_at}",and(createdAt.eq."{created_at}",id.{op}."{row_id}")')
+    return query.order("createdAt", desc=desc).order("id", desc=desc).limit(limit + 1)
+
+def page(rows: list, limit: int):
+    # -> (rows of this page, cursor of the next page or None)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: proxies may turn strong tags weak
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return etag.removeprefix("W/") in tags
+
+def conditional_json(request: Request, data, next_cursor: str = None) -> Response:
+    """JSON response with an ETag over the body: 304 when the client already has it,
+    gzip when accepted and worth it. Browsers revalidate automatically
+    (Cache-Control: no-cache), so polling an unchanged list costs headers only."""
+    body = json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = 'W/"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization, Accept-Encoding",
+    }
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
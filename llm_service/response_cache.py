@@ -0,0 +1,98 @@
+import time
+import threading
+
+import numpy as np
+
+class SemanticResponseCache:
+    """Answer cache for repeated RAG questions.
+
+    A cached answer is reused when the new question's embedding is within
+    `threshold` cosine similarity of a cached question, the same model is asked,
+    retrieval returned exactly the same chunks and the `scope` key matches. The
+    caller derives `scope` from the conversation the answer was written for, so a
+    follow-up like "explain that in more detail" never gets another chat's answer.
+    Entries remember which documents their chunks came from so a corpus change can
+    drop them.
+    """
+
+    def __init__(self, threshold: float = 0.97, max_entries: int = 512, ttl_seconds: int = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = []
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _rebuild(self):
+        self._matrix = np.stack([e["vector"] for e in self._entries]) if self._entries else None
+
+    def _drop_expired(self):
+        now = time.monotonic()
+        alive = [e for e in self._entries if e["expires_at"] >= now]
+        if len(alive) != len(self._entries):
+            self._entries = alive
+            self._rebuild()
+
+    def lookup(self, query_vector, chunk_ids, model: str, scope: str = ""):
+        chunk_ids = tuple(chunk_ids)
+        with self._lock:
+            self._drop_expired()
+            if self._matrix is not None:
+                scores = self._matrix @ self._unit(query_vector)
+                # Best-scoring candidates first; the chunk/model check decides
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    entry = self._entries[i]
+                    if entry["model"] == model and entry["chunk_ids"] == chunk_ids and entry["scope"] == scope:
+                        self.hits += 1
+                        return entry["answer"]
+            self.misses += 1
+            return None
+
+    def store(self, query_vector, chunk_ids, doc_ids, model: str, answer: str, scope: str = ""):
+        with self._lock:
+            self._entries.append({
+                "vector": self._unit(query_vector),
+                "chunk_ids": tuple(chunk_ids),
+                "doc_ids": frozenset(doc_ids),
+                "model": model,
+                "scope": scope,
+                "answer": answer,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            })
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+            self._rebuild()
+
+    def invalidate_document(self, doc_id: str):
+        with self._lock:
+            kept = [e for e in self._entries if doc_id not in e["doc_ids"]]
+            removed = len(self._entries) - len(kept)
+            if removed:
+                self._entries = kept
+                self._rebuild()
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._matrix = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+        }
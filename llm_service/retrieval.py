@@ -0,0 +1,206 @@
+import os
+import time
+import asyncio
+import hashlib
+from dataclasses import dataclass, field
+
+from langchain_core.documents import Document
+
+from io_pool import run_blocking
+from metrics import stage
+from keyword_index import tokenize
+
+# Hybrid retrieval: dense (vector store) and keyword (BM25, keyword_index.py) candidates
+# are fused with reciprocal-rank fusion, optionally rescored by a local reranker, and
+# de-duplicated with MMR before the top k go into the prompt. Every step can be chosen
+# per request (see RetrievalOptions); the defaults come from the environment.
+
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")  # dense | keyword | hybrid
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+# Candidates taken from each list before fusion/reranking/MMR
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+RETRIEVAL_RERANK = os.getenv("RETRIEVAL_RERANK", "false").lower() == "true"
+RETRIEVAL_MMR = os.getenv("RETRIEVAL_MMR", "true").lower() == "true"
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.8"))
+RRF_K = 60
+
+def chunk_id(doc) -> str:
+    # Stable identity of a retrieved chunk: owning document + content hash
+    digest = hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()[:16]
+    return f"{doc.metadata.get('doc_id', '')}:{digest}"
+
+def to_document(match) -> Document:
+    # The chunk body is stored under the "text" metadata key (vector and keyword index alike)
+    metadata = dict(match.metadata)
+    text = metadata.pop("text", "")
+    return Document(page_content=text, metadata=metadata)
+
+def reciprocal_rank_fusion(result_lists, k: int = RRF_K):
+    """[(doc, score)] ordered by sum(1 / (k + rank)) over the lists a chunk appears in."""
+    scores = {}
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = chunk_id(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(((docs[key], score) for key, score in scores.items()), key=lambda pair: -pair[1])
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def mmr(scored, k: int, lambda_mult: float = MMR_LAMBDA):
+    """Maximal marginal relevance over (doc, score) pairs: trades relevance against
+    term overlap with the chunks already picked, so near-duplicate chunks (repeated
+    headers, the same table on two pages) don't fill the context."""
+    if not scored:
+        return []
+    # Min-max normalized relevance: reranker scores can be negative (cross-encoder
+    # logits), where dividing by the top score would invert the order
+    scores = [score for _, score in scored]
+    low, span = min(scores), (max(scores) - min(scores)) or 1.0
+    candidates = [(doc, score, (score - low) / span, set(tokenize(doc.page_content))) for doc, score in scored]
+    picked = []
+    while candidates and len(picked) < k:
+        best = max(
+            range(len(candidates)),
+            key=lambda i: lambda_mult * candidates[i][2]
+            - (1 - lambda_mult) * max((jaccard(candidates[i][3], p[3]) for p in picked), default=0.0)
+        )
+        picked.append(candidates.pop(best))
+    return [(doc, score) for doc, score, _, _ in picked]
+
+class LexicalReranker:
+    """Dependency-free reranker: blends the fused rank score with the share of query
+    terms a chunk contains, which lifts chunks that carry every code/amount asked for."""
+
+    def __init__(self, weight: float = 0.5):
+        self.weight = weight
+
+    def score(self, query: str, docs: list) -> list:
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return [0.0] * len(docs)
+        return [len(query_terms & set(tokenize(doc.page_content))) / len(query_terms) for doc in docs]
+
+    def rerank(self, query: str, scored):
+        if not scored:
+            return scored
+        top = scored[0][1] or 1.0
+        coverage = self.score(query, [doc for doc, _ in scored])
+        rescored = [(doc, (1 - self.weight) * score / top + self.weight * cov)
+                    for (doc, score), cov in zip(scored, coverage)]
+        return sorted(rescored, key=lambda pair: -pair[1])
+
+class CrossEncoderReranker:
+    """Local cross-encoder (sentence-transformers), e.g. a small multilingual MiniLM.
+    Heavier than LexicalReranker but reads query and chunk together."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import CrossEncoder  # optional dependency
+        self.model = CrossEncoder(model_name)
+
+    def rerank(self, query: str, scored):
+        if not scored:
+            return scored
+        scores = self.model.predict([(query, doc.page_content) for doc, _ in scored])
+        return sorted(((doc, float(s)) for (doc, _), s in zip(scored, scores)), key=lambda pair: -pair[1])
+
+@dataclass
+class RetrievalOptions:
+    mode: str = RETRIEVAL_MODE
+    k: int = RETRIEVAL_K
+    candidates: int = RETRIEVAL_CANDIDATES
+    rerank: bool = RETRIEVAL_RERANK
+    mmr: bool = RETRIEVAL_MMR
+    mmr_lambda: float = MMR_LAMBDA
+    filter: dict = None  # metadata filter applied to both indexes
+
+@dataclass
+class RetrievalResult:
+    docs: list
+    query_vector: list  # None in keyword-only mode
+    timings: dict = field(default_factory=dict)
+
+class Retriever:
+    """Long-lived RAG retriever created once at startup.
+
+    The query is embedded exactly once and the same vector is used for the
+    vector store lookup, so a chat turn costs one embedding round-trip and
+    reuses a single store handle (Pinecone or local, see vector_store.py).
+    The keyword lookup runs concurrently with the embedding and vector query.
+    """
+
+    def __init__(self, store, embeddings, keyword_index=None, reranker=None, k: int = RETRIEVAL_K):
+        self.store = store
+        self.embeddings = embeddings
+        self.keyword_index = keyword_index
+        self.reranker = reranker
+        self.k = k
+
+    def query(self, query_vector, k: int, filter: dict = None) -> list:
+        return [to_document(m) for m in self.store.query(query_vector, top_k=k, filter=filter)]
+
+    def keyword_query(self, query: str, k: int, filter: dict = None) -> list:
+        return [to_document(m) for m in self.keyword_index.search(query, top_k=k, filter=filter)]
+
+    async def embed(self, query: str):
+        return await self.embeddings.aembed_query(query)
+
+    async def _dense(self, query: str, k: int, filter: dict, timings: dict):
+        start = time.perf_counter()
+        with stage("chat", "embed"):
+            query_vector = await self.embed(query)
+        timings["embed_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with stage("chat", "vector_query"):
+            docs = await run_blocking(self.query, query_vector, k, filter)
+        timings["query_ms"] = (time.perf_counter() - start) * 1000
+        return docs, query_vector
+
+    async def _keyword(self, query: str, k: int, filter: dict, timings: dict):
+        start = time.perf_counter()
+        with stage("chat", "keyword_query"):
+            docs = await run_blocking(self.keyword_query, query, k, filter)
+        timings["keyword_ms"] = (time.perf_counter() - start) * 1000
+        return docs
+
+    async def search(self, query: str, options: RetrievalOptions = None) -> RetrievalResult:
+        options = options or RetrievalOptions(k=self.k)
+        timings = {}
+        use_dense = options.mode in ("dense", "hybrid")
+        use_keyword = options.mode in ("keyword", "hybrid") and self.keyword_index is not None
+        rerank = options.rerank and self.reranker is not None
+        # Plain dense search only needs k; anything that reorders needs a candidate pool
+        pool = max(options.k, options.candidates) if (use_keyword or rerank or options.mmr) else options.k
+
+        # 1. Candidate lists (concurrently)
+        tasks = []
+        if use_dense or not use_keyword:
+            tasks.append(self._dense(query, pool, options.filter, timings))
+        if use_keyword:
+            tasks.append(self._keyword(query, pool, options.filter, timings))
+        results = await asyncio.gather(*tasks)
+        query_vector = None
+        lists = []
+        if use_dense or not use_keyword:
+            dense_docs, query_vector = results[0]
+            lists.append(dense_docs)
+        if use_keyword:
+            lists.append(results[-1])
+
+        # 2. Fusion (a single list keeps its order)
+        scored = reciprocal_rank_fusion(lists)
+
+        # 3. Rerank, then 4. MMR / cut to k
+        if rerank:
+            start = time.perf_counter()
+            with stage("chat", "rerank"):
+                scored = await run_blocking(self.reranker.rerank, query, scored)
+            timings["rerank_ms"] = (time.perf_counter() - start) * 1000
+        if options.mmr:
+            scored = mmr(scored, options.k, options.mmr_lambda)
+        docs = [doc for doc, _ in scored[:options.k]]
+
+        return RetrievalResult(docs=docs, query_vector=query_vector, timings=timings)
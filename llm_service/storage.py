@@ -0,0 +1,151 @@
+import logging
+import base64
+import asyncio
+
+import httpx
+
+from io_pool import run_blocking
+
+logger = logging.getLogger("llm_service.storage")
+
+# Supabase's resumable (TUS) endpoint requires every chunk but the last to be exactly 6MB
+TUS_CHUNK_SIZE = 6 * 1024 * 1024
+TUS_VERSION = "1.0.0"
+UPLOAD_MAX_RETRIES = 3
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+class UploadTooLarge(Exception):
+    pass
+
+async def iter_upload_file(file, chunk_size: int = TUS_CHUNK_SIZE):
+    # Reads a Starlette UploadFile (already spooled to disk) without loading it whole
+    await file.seek(0)
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+async def rechunk(chunks, size: int):
+    # Re-slices an async byte stream into pieces of exactly `size` (the last may be shorter)
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
+def _tus_metadata(**fields) -> str:
+    return ",".join(
+        f"{key} {base64.b64encode(value.encode('utf-8')).decode('ascii')}"
+        for key, value in fields.items()
+    )
+
+class StorageClient:
+    """Streaming upload/download against Supabase Storage.
+
+    Uploads go through the resumable (TUS) protocol one 6MB chunk at a time, so memory
+    per upload is bounded by the chunk size; a chunk that fails mid-transfer is resumed
+    from the offset the server reports. Downloads are streamed straight to a file.
+    """
+
+    def __init__(self, url: str, key: str, bucket: str, max_upload_bytes: int):
+        self.base_url = url.rstrip("/") + "/storage/v1"
+        self.bucket = bucket
+        self.max_upload_bytes = max_upload_bytes
+        self.headers = {"Authorization": f"Bearer {key}", "apikey": key}
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(60.0, connect=10.0)
+            )
+        return self._client
+
+    async def upload_stream(self, path: str, chunks, length: int, content_type: str = None) -> int:
+        """Uploads `length` bytes from the async iterator `chunks`; returns bytes stored."""
+        if length > self.max_upload_bytes:
+            raise UploadTooLarge(f"File is {length} bytes; the limit is {self.max_upload_bytes}")
+
+        tus_headers = {"Tus-Resumable": TUS_VERSION}
+        resp = await self.client.post(
+            f"{self.base_url}/upload/resumable",
+            headers={
+                **tus_headers,
+                "Upload-Length": str(length),
+                "Upload-Metadata": _tus_metadata(
+                    bucketName=self.bucket,
+                    objectName=path,
+                    contentType=content_type or "application/octet-stream",
+                    cacheControl="3600"
+                ),
+                "x-upsert": "false",
+            }
+        )
+        resp.raise_for_status()
+        location = str(resp.url.join(resp.headers["Location"]))
+
+        offset = 0
+        try:
+            async for chunk in rechunk(chunks, TUS_CHUNK_SIZE):
+                if offset + len(chunk) > length:
+                    raise UploadTooLarge(f"Request body is longer than the declared {length} bytes")
+                offset = await self._send_chunk(location, offset, chunk)
+            if offset != length:
+                raise ValueError(f"Upload ended after {offset} of {length} bytes")
+        except BaseException:
+            # Release the partial upload on the server
+            try:
+                await self.client.delete(location, headers=tus_headers)
+            except Exception:
+                pass
+            raise
+        return offset
+
+    async def _send_chunk(self, location: str, start: int, chunk: bytes) -> int:
+        # Supabase stores a resumable upload in whole TUS_CHUNK_SIZE parts: every PATCH
+        # but the last must be exactly one part, so a failed chunk is re-sent whole
+        for attempt in range(UPLOAD_MAX_RETRIES + 1):
+            try:
+                resp = await self.client.patch(
+                    location,
+                    content=chunk,
+                    headers={
+                        "Tus-Resumable": TUS_VERSION,
+                        "Upload-Offset": str(start),
+                        "Content-Type": "application/offset+octet-stream",
+                    }
+                )
+                resp.raise_for_status()
+                return int(resp.headers["Upload-Offset"])
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = isinstance(e, httpx.TransportError) or e.response.status_code in (409, 429) \
+                    or e.response.status_code >= 500
+                if attempt == UPLOAD_MAX_RETRIES or not retryable:
+                    raise
+                logger.warning("Upload chunk failed, retrying", extra={"offset": start, "error": str(e)})
+                await asyncio.sleep(2 ** attempt)
+                # The chunk may have been stored even though the response was lost
+                head = await self.client.head(location, headers={"Tus-Resumable": TUS_VERSION})
+                head.raise_for_status()
+                offset = int(head.headers["Upload-Offset"])
+                if offset == start + len(chunk):
+                    return offset
+                if offset != start:
+                    raise ValueError(f"Upload offset {offset} is not on a chunk boundary (expected {start})")
+
+    async def download_to(self, path: str, dest) -> int:
+        """Streams an object into the open binary file `dest`; returns bytes written."""
+        written = 0
+        async with self.client.stream("GET", f"{self.base_url}/object/{self.bucket}/{path}") as resp:
+            resp.raise_for_status()
+            async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                await run_blocking(dest.write, chunk)
+                written += len(chunk)
+        await run_blocking(dest.flush)
+        return written
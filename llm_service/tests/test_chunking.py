@@ -0,0 +1,37 @@
+from chunking import Chunker
+
+def words(text: str) -> int:
+    return len(text.split())
+
+def test_headings_start_chunks_and_record_section_path():
+    page = "# Report\n\n## Results\n\nRevenue grew.\n\n## Costs\n\nCosts were flat."
+    chunks = Chunker(words, max_tokens=50, min_tokens=0).chunk_pages([page])
+    assert [c.section for c in chunks] == ["Report > Results", "Report > Costs"]
+    assert chunks[0].text == "Report\n\nResults\n\nRevenue grew."
+    assert chunks[1].text == "Costs\n\nCosts were flat."
+
+def test_chunks_stay_under_budget_and_keep_page_span():
+    pages = [" ".join(f"w{p}{i}" for i in range(30)) for p in range(3)]
+    chunks = Chunker(words, max_tokens=20, min_tokens=0).chunk_pages(pages)
+    assert all(c.tokens <= 20 for c in chunks)
+    assert all(c.page == c.page_end for c in chunks)  # page ends close a chunk
+    assert [c.page for c in chunks] == [1, 1, 2, 2, 3, 3]
+    assert " ".join(c.text for c in chunks).split() == " ".join(pages).split()
+
+def test_small_tail_is_folded_into_previous_chunk():
+    page = " ".join(f"a{i}" for i in range(8)) + "\n\n" + "b0 b1"
+    chunks = Chunker(words, max_tokens=8, min_tokens=4).chunk_pages([page])
+    assert len(chunks) == 1
+    assert chunks[0].text.endswith("b0 b1")
+
+def test_large_table_splits_between_rows_and_repeats_header():
+    rows = "\n".join(f"| r{i} | {i} |" for i in range(10))
+    page = "| name | value |\n| --- | --- |\n" + rows
+    chunks = Chunker(words, max_tokens=15, min_tokens=0).chunk_pages([page])
+    assert len(chunks) > 1
+    for chunk in chunks:
+        lines = chunk.text.splitlines()
+        assert lines[0] == "name | value"
+        assert all(line.startswith("r") for line in lines[1:])
+    body = [line for c in chunks for line in c.text.splitlines()[1:]]
+    assert body == [f"r{i} | {i}" for i in range(10)]
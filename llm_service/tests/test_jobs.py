@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from jobs import JobQueue, QUEUED, RUNNING, DONE, FAILED
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), max_attempts=2, lease_seconds=60)
+
+def make_runnable(queue, job_id):
+    # Skip the backoff delay
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET run_after = 0 WHERE id = ?", (job_id,))
+
+def expire_lease(queue, job_id):
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET lease_expires = ? WHERE id = ?", (time.time() - 1, job_id))
+
+def test_enqueue_keeps_one_active_job_per_document(queue):
+    first = queue.enqueue("doc-1", {"n": 1})
+    second = queue.enqueue("doc-1", {"n": 2})
+    assert second["id"] == first["id"]
+    assert second["payload"] == {"n": 1}
+    assert queue.has_active_job("doc-1")
+    assert queue.depth()[QUEUED] == 1
+
+def test_claim_leases_job_to_one_worker(queue):
+    job = queue.enqueue("doc-1", {})
+    claimed = queue.claim("worker-a")
+    assert claimed["id"] == job["id"]
+    assert claimed["status"] == RUNNING
+    assert claimed["locked_by"] == "worker-a"
+    assert claimed["attempts"] == 1
+    assert queue.claim("worker-b") is None
+
+def test_complete_records_progress_and_frees_document(queue):
+    job = queue.enqueue("doc-1", {})
+    queue.claim("worker-a")
+    queue.heartbeat(job["id"], pages_done=2, pages_total=5)
+    queue.complete(job["id"])
+    latest = queue.latest_for_docs(["doc-1"])["doc-1"]
+    assert latest["status"] == DONE
+    assert latest["pages_done"] == 5
+    assert not queue.has_active_job("doc-1")
+    assert [doc_id for doc_id, _ in queue.completed_since(0)] == ["doc-1"]
+
+def test_fail_backs_off_then_gives_up(queue):
+    job = queue.enqueue("doc-1", {})
+    queue.claim("worker-a")
+    assert queue.fail(job["id"], "boom") is True
+    retried = queue.latest_for_docs(["doc-1"])["doc-1"]
+    assert retried["status"] == QUEUED
+    assert retried["run_after"] >= time.time() + 25  # ~30s backoff
+    assert queue.claim("worker-a") is None
+
+    make_runnable(queue, job["id"])
+    assert queue.claim("worker-a")["attempts"] == 2
+    assert queue.fail(job["id"], "boom again") is False
+    failed = queue.latest_for_docs(["doc-1"])["doc-1"]
+    assert failed["status"] == FAILED
+    assert failed["error"] == "boom again"
+
+def test_recover_stale_requeues_expired_lease(queue):
+    job = queue.enqueue("doc-1", {})
+    queue.claim("worker-a")
+    queue.heartbeat(job["id"])
+    assert queue.recover_stale() == []  # lease still valid
+
+    expire_lease(queue, job["id"])
+    assert queue.recover_stale() == []
+    assert queue.claim("worker-b")["locked_by"] == "worker-b"
+
+def test_recover_stale_gives_up_after_last_attempt(queue):
+    job = queue.enqueue("doc-1", {})
+    queue.claim("worker-a")
+    queue.fail(job["id"], "boom")
+    make_runnable(queue, job["id"])
+    queue.claim("worker-a")
+    expire_lease(queue, job["id"])
+    given_up = queue.recover_stale()
+    assert [j["id"] for j in given_up] == [job["id"]]
+    assert queue.depth()[FAILED] == 1
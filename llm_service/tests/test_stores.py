@@ -0,0 +1,82 @@
+import pytest
+
+from vector_store import LocalVectorStore, VectorStore, matches_filter
+from keyword_index import KeywordIndex
+from indexing import ChunkManifest, content_hash
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalVectorStore(str(tmp_path / "vectors"))
+    store.upsert([
+        {"id": "a", "values": [1, 0, 0], "metadata": {"doc_id": "d1", "user_id": "u1", "page": 1}},
+        {"id": "b", "values": [0.9, 0.1, 0], "metadata": {"doc_id": "d2", "user_id": "u2", "page": 1}},
+        {"id": "c", "values": [0, 1, 0], "metadata": {"doc_id": "d1", "user_id": "u1", "page": 2}},
+    ])
+    return store
+
+def test_backend_missing_a_method_fails_at_construction():
+    class Partial(VectorStore):
+        def upsert(self, vectors):
+            pass
+    with pytest.raises(TypeError):
+        Partial()
+
+def test_local_query_ranks_by_cosine(store):
+    assert [m.id for m in store.query([1, 0, 0], top_k=2)] == ["a", "b"]
+
+def test_local_query_applies_indexed_and_plain_filters(store):
+    assert [m.id for m in store.query([1, 0, 0], top_k=3, filter={"user_id": "u1"})] == ["a", "c"]
+    assert [m.id for m in store.query([1, 0, 0], top_k=3, filter={"doc_id": {"$in": ["d2"]}})] == ["b"]
+    scoped = {"$and": [{"user_id": "u1"}, {"page": 2}]}
+    assert [m.id for m in store.query([1, 0, 0], top_k=3, filter=scoped)] == ["c"]
+
+def test_local_delete_and_row_reuse(store, tmp_path):
+    store.delete(filter={"doc_id": "d1"})
+    assert [m.id for m in store.query([1, 0, 0], top_k=3)] == ["b"]
+    store.upsert([{"id": "d", "values": [0, 0, 1], "metadata": {"doc_id": "d3"}}])
+    # Another process opening the directory sees the same state
+    reopened = LocalVectorStore(str(tmp_path / "vectors"))
+    assert sorted(m.id for m in reopened.query([1, 1, 1], top_k=5)) == ["b", "d"]
+    assert reopened.stats()["rows"] == 3  # tombstoned rows were reused
+
+def test_local_set_metadata_merges_without_touching_vectors(store):
+    store.set_metadata({"c": {"page": 7}})
+    match = store.query([0, 1, 0], top_k=1)[0]
+    assert match.id == "c"
+    assert match.metadata == {"doc_id": "d1", "user_id": "u1", "page": 7}
+
+def test_matches_filter_operators():
+    metadata = {"doc_id": "d1", "page": 3}
+    assert matches_filter(metadata, {"page": {"$gte": 3}})
+    assert not matches_filter(metadata, {"doc_id": {"$nin": ["d1"]}})
+    assert matches_filter(metadata, {"$or": [{"doc_id": "x"}, {"page": 3}]})
+
+def test_keyword_index_scopes_search_and_replaces_documents(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keywords.sqlite3"))
+    index.index_document("d1", ["양도소득세 세율표", "general notes"],
+                         [{"doc_id": "d1", "user_id": "u1"}, {"doc_id": "d1", "user_id": "u1"}])
+    index.index_document("d2", ["양도소득세 신고 기한"], [{"doc_id": "d2", "user_id": "u2"}])
+
+    assert {m.metadata["doc_id"] for m in index.search("양도소득세", top_k=5)} == {"d1", "d2"}
+    scoped = index.search("양도소득세", top_k=5, filter={"user_id": "u2"})
+    assert [m.metadata["doc_id"] for m in scoped] == ["d2"]
+
+    index.index_document("d1", ["replaced text"], [{"doc_id": "d1", "user_id": "u1"}])
+    assert [m.metadata["doc_id"] for m in index.search("양도소득세", top_k=5)] == ["d2"]
+    index.delete_document("d2")
+    assert index.search("양도소득세", top_k=5) == []
+    assert index.doc_ids() == ["d1"]
+
+def test_chunk_manifest_round_trip(tmp_path):
+    manifest = ChunkManifest(str(tmp_path / "manifest.sqlite3"))
+    assert manifest.get("d1") is None
+    manifest.replace("d1", {"v1": {"page": 1}, "v2": {"page": 2}})
+    assert manifest.get("d1") == {"v1": {"page": 1}, "v2": {"page": 2}}
+    assert manifest.doc_ids() == ["d1"]
+    manifest.delete("d1")
+    assert manifest.get("d1") is None
+
+def test_content_hash_ignores_position_only():
+    base = {"doc_id": "d1", "filename": "a.pdf", "page": 1}
+    assert content_hash("text", base) == content_hash("text", {**base, "page": 9, "page_end": 9})
+    assert content_hash("text", base) != content_hash("text", {**base, "filename": "b.pdf"})
@@ -0,0 +1,61 @@
+import logging
+import threading
+
+logger = logging.getLogger("llm_service.tokens")
+
+try:
+    import tiktoken
+except ImportError:  # fall back to the character heuristic
+    tiktoken = None
+
+# gpt-4o / gpt-4o-mini and newer chat models use o200k_base; older models cl100k_base
+DEFAULT_ENCODING = "o200k_base"
+_LEGACY_PREFIXES = ("gpt-4", "gpt-3.5", "text-embedding")
+_MODERN_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+
+_encodings = {}
+_lock = threading.Lock()
+
+def encoding_name_for_model(model: str = None) -> str:
+    if not model:
+        return DEFAULT_ENCODING
+    if model.startswith(_MODERN_PREFIXES):
+        return "o200k_base"
+    if model.startswith(_LEGACY_PREFIXES):
+        return "cl100k_base"
+    return DEFAULT_ENCODING
+
+def get_encoding(model: str = None):
+    # Encoders are loaded lazily, once per process (loading o200k_base takes ~100ms).
+    # The BPE files are baked into the image (see Dockerfile); if loading still fails
+    # the failure is remembered and callers fall back to the heuristic.
+    if tiktoken is None:
+        return None
+    name = encoding_name_for_model(model)
+    if name not in _encodings:
+        with _lock:
+            if name not in _encodings:
+                try:
+                    _encodings[name] = tiktoken.get_encoding(name)
+                except Exception as e:
+                    logger.warning("Tokenizer unavailable, using heuristic counts", extra={"encoding": name, "error": str(e)})
+                    _encodings[name] = None
+    return _encodings[name]
+
+def heuristic_count(text: str) -> int:
+    # Previous approximation (1 token ~= 4 chars); badly undercounts Korean
+    return len(text) // 4
+
+def count_tokens(text: str, model: str = None) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return heuristic_count(text)
+    # disallowed_special=() so user text containing "<|endoftext|>" is counted, not rejected
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_tokens_batch(texts, model: str = None, num_threads: int = 8) -> list:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return [heuristic_count(t) for t in texts]
+    # encode_batch runs the Rust encoder across threads without holding the GIL
+    return [len(ids) for ids in encoding.encode_batch(list(texts), num_threads=num_threads, disallowed_special=())]
@@ -0,0 +1,359 @@
+import os
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import numpy as np
+
+# Vector store interface used by retrieval, ingestion and deletes. Methods are blocking
+# (call them through run_blocking) and take Pinecone-style vectors and metadata filters:
+#
+#   store.upsert([{"id": ..., "values": [...], "metadata": {...}}])
+#   store.query(vector, top_k=4, filter={"doc_id": {"$in": [...]}})  -> [Match]
+#   store.delete(ids=[...]) / store.delete(filter={"doc_id": doc_id})
+#   store.set_metadata({id: {"page": 3}})  (merges fields into stored metadata, no re-embed)
+#
+# Backends: PineconeStore (hosted) and LocalVectorStore (NumPy, memory-mapped files in
+# DATA_DIR), selected with VECTOR_STORE=pinecone|local.
+
+@dataclass
+class Match:
+    id: str
+    score: float
+    metadata: dict
+
+class VectorStore(ABC):
+    # A backend missing a method fails at construction, not on the first call
+
+    @abstractmethod
+    def upsert(self, vectors: list):
+        ...
+
+    @abstractmethod
+    def query(self, vector, top_k: int, filter: dict = None) -> list:
+        ...
+
+    @abstractmethod
+    def delete(self, ids: list = None, filter: dict = None):
+        ...
+
+    @abstractmethod
+    def set_metadata(self, updates: dict):
+        ...
+
+class PineconeStore(VectorStore):
+    def __init__(self, index):
+        self.index = index
+
+    def upsert(self, vectors: list):
+        self.index.upsert(vectors=vectors)
+
+    def query(self, vector, top_k: int, filter: dict = None) -> list:
+        res = self.index.query(vector=list(vector), top_k=top_k, filter=filter, include_metadata=True)
+        return [Match(m.id, m.score, dict(m.metadata or {})) for m in res.matches]
+
+    def delete(self, ids: list = None, filter: dict = None):
+        if ids is not None:
+            self.index.delete(ids=ids)
+        else:
+            self.index.delete(filter=filter)
+
+    def set_metadata(self, updates: dict):
+        # Pinecone updates one vector per request; callers only send the chunks that moved
+        for vid, metadata in updates.items():
+            self.index.update(id=vid, set_metadata=metadata)
+
+def _compare(value, op: str, operand) -> bool:
+    if op == "$eq":
+        return value == operand
+    if op == "$ne":
+        return value != operand
+    if op == "$in":
+        return value in operand
+    if op == "$nin":
+        return value not in operand
+    if op == "$exists":
+        return (value is not None) == bool(operand)
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > operand
+    if op == "$gte":
+        return value >= operand
+    if op == "$lt":
+        return value < operand
+    if op == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+def matches_filter(metadata: dict, filter: dict) -> bool:
+    """Evaluates a Pinecone metadata filter against one metadata dict."""
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+def indexed_values(filter: dict, field: str):
+    """Values a top-level equality/$in condition allows for `field` (None if unconstrained)."""
+    if not filter:
+        return None
+    allowed = None
+    conditions = [filter] + [sub for sub in filter.get("$and", []) if isinstance(sub, dict)]
+    for condition in conditions:
+        value = condition.get(field)
+        if value is None:
+            continue
+        if isinstance(value, dict):
+            if "$eq" in value:
+                values = {value["$eq"]}
+            elif "$in" in value:
+                values = set(value["$in"])
+            else:
+                continue
+        else:
+            values = {value}
+        allowed = values if allowed is None else allowed & values
+    return allowed
+
+class LocalVectorStore(VectorStore):
+    """In-process brute-force cosine index for small corpora and offline deployments.
+
+    Vectors are L2-normalized float32 rows in a memory-mapped file (vectors.f32); ids
+    and metadata live in SQLite next to it. A query is one matrix-vector product over
+    the mapped rows, so the OS page cache keeps it in memory without loading it all
+    into the heap. Deleted rows are tombstoned and reused by later upserts.
+
+    Several processes (API, workers) can share the directory: writers serialize on the
+    SQLite write lock and bump a generation counter, and readers reload ids/metadata
+    when it changes.
+
+    Filters on doc_id / user_id are answered from an in-memory row index first, so a
+    scoped query only scores that user's or those documents' rows.
+    """
+
+    GROW_ROWS = 1024
+    INDEXED_FIELDS = ("doc_id", "user_id")
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.db_path = os.path.join(directory, "vectors.sqlite3")
+        self.matrix_path = os.path.join(directory, "vectors.f32")
+        self._lock = threading.RLock()
+        self._generation = None
+        self._dim = None
+        self._matrix = None
+        self._ids = []
+        self._metadata = []
+        self._live = np.zeros(0, dtype=bool)
+        self._rows_by = {field: {} for field in self.INDEXED_FIELDS}
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS vectors (
+                    row INTEGER PRIMARY KEY,
+                    id TEXT UNIQUE,
+                    metadata TEXT
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _get_meta(conn, key: str):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_meta(conn, key: str, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _open_matrix(self, rows: int):
+        if not self._dim or rows == 0 or not os.path.exists(self.matrix_path):
+            return None
+        return np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(rows, self._dim))
+
+    def _refresh(self):
+        # Reload ids/metadata if another process (or this one) wrote since the last look
+        with self._connect() as conn:
+            generation = self._get_meta(conn, "generation")
+            if generation == self._generation:
+                return
+            dim = self._get_meta(conn, "dim")
+            rows = conn.execute("SELECT row, id, metadata FROM vectors ORDER BY row").fetchall()
+        self._dim = int(dim) if dim else None
+        size = rows[-1][0] + 1 if rows else 0
+        self._ids = [None] * size
+        self._metadata = [None] * size
+        self._live = np.zeros(size, dtype=bool)
+        rows_by = {field: {} for field in self.INDEXED_FIELDS}
+        for row, vid, metadata in rows:
+            if vid is not None:
+                self._ids[row] = vid
+                self._metadata[row] = json.loads(metadata)
+                self._live[row] = True
+                for field in self.INDEXED_FIELDS:
+                    value = self._metadata[row].get(field)
+                    if value is not None:
+                        rows_by[field].setdefault(value, []).append(row)
+        self._rows_by = {field: {v: np.asarray(r) for v, r in index.items()} for field, index in rows_by.items()}
+        self._matrix = self._open_matrix(size)
+        self._generation = generation
+
+    def _write_rows(self, rows, values, capacity: int):
+        # Grow the file in GROW_ROWS steps, then write the vectors in place
+        needed = capacity * self._dim * 4
+        current = os.path.getsize(self.matrix_path) if os.path.exists(self.matrix_path) else 0
+        if needed > current:
+            grown = ((capacity + self.GROW_ROWS - 1) // self.GROW_ROWS) * self.GROW_ROWS
+            with open(self.matrix_path, "ab") as f:
+                f.truncate(grown * self._dim * 4)
+        matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+        matrix[rows] = values
+        matrix.flush()
+        del matrix
+
+    def upsert(self, vectors: list):
+        if not vectors:
+            return
+        values = np.asarray([v["values"] for v in vectors], dtype=np.float32)
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values = values / np.where(norms == 0, 1, norms)
+
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            dim = self._get_meta(conn, "dim")
+            if dim is None:
+                self._set_meta(conn, "dim", values.shape[1])
+            elif int(dim) != values.shape[1]:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match index dimension {dim}")
+            self._dim = values.shape[1]
+
+            free = [r for (r,) in conn.execute("SELECT row FROM vectors WHERE id IS NULL ORDER BY row")]
+            next_row = (conn.execute("SELECT COALESCE(MAX(row), -1) FROM vectors").fetchone()[0]) + 1
+            rows = []
+            for v in vectors:
+                existing = conn.execute("SELECT row FROM vectors WHERE id = ?", (v["id"],)).fetchone()
+                if existing:
+                    row = existing[0]
+                elif free:
+                    row = free.pop(0)
+                else:
+                    row = next_row
+                    next_row += 1
+                rows.append(row)
+                conn.execute(
+                    "INSERT OR REPLACE INTO vectors (row, id, metadata) VALUES (?, ?, ?)",
+                    (row, v["id"], json.dumps(v.get("metadata") or {}, ensure_ascii=False))
+                )
+            self._write_rows(rows, values, next_row)
+            self._set_meta(conn, "generation", os.urandom(8).hex())
+            conn.execute("COMMIT")
+
+    def delete(self, ids: list = None, filter: dict = None):
+        with self._lock:
+            if ids is None:
+                self._refresh()
+                ids = [self._ids[row] for row in np.flatnonzero(self._live)
+                       if matches_filter(self._metadata[row], filter or {})]
+            if not ids:
+                return
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("UPDATE vectors SET id = NULL, metadata = NULL WHERE id = ?", [(i,) for i in ids])
+                self._set_meta(conn, "generation", os.urandom(8).hex())
+                conn.execute("COMMIT")
+
+    def set_metadata(self, updates: dict):
+        if not updates:
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for vid, fields in updates.items():
+                row = conn.execute("SELECT metadata FROM vectors WHERE id = ?", (vid,)).fetchone()
+                if row is None:
+                    continue
+                metadata = {**json.loads(row[0]), **fields}
+                conn.execute("UPDATE vectors SET metadata = ? WHERE id = ?", (json.dumps(metadata, ensure_ascii=False), vid))
+            self._set_meta(conn, "generation", os.urandom(8).hex())
+            conn.execute("COMMIT")
+
+    def _candidate_rows(self, filter: dict):
+        # Live rows allowed by the indexed fields of the filter (None: all rows)
+        rows = None
+        for field in self.INDEXED_FIELDS:
+            values = indexed_values(filter, field)
+            if values is None:
+                continue
+            index = self._rows_by[field]
+            found = [index[v] for v in values if v in index]
+            allowed = np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+            rows = allowed if rows is None else np.intersect1d(rows, allowed)
+        return rows
+
+    def query(self, vector, top_k: int, filter: dict = None) -> list:
+        with self._lock:
+            self._refresh()
+            if self._matrix is None or not self._live.any():
+                return []
+            q = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(q)
+            if norm:
+                q = q / norm
+
+            rows = self._candidate_rows(filter)
+            if rows is None:
+                rows = np.flatnonzero(self._live)
+                scores = self._matrix @ q
+                scores = scores[rows]
+            else:
+                scores = self._matrix[rows] @ q if len(rows) else np.zeros(0, dtype=np.float32)
+            if not len(rows):
+                return []
+
+            if filter is None:
+                k = min(top_k, len(rows))
+                top = np.argpartition(-scores, k - 1)[:k]
+                order = top[np.argsort(-scores[top])]
+            else:
+                # Best-first walk until top_k rows pass the (rest of the) filter
+                order = np.argsort(-scores)
+
+            results = []
+            for i in order:
+                row = rows[i]
+                metadata = self._metadata[row]
+                if filter is None or matches_filter(metadata, filter):
+                    results.append(Match(self._ids[row], float(scores[i]), dict(metadata)))
+                    if len(results) == top_k:
+                        break
+            return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return {"vectors": int(self._live.sum()), "rows": len(self._ids), "dimension": self._dim}
@@ -0,0 +1,101 @@
+import io
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+from PIL import Image
+
+def image_key(image_bytes: bytes, prompt_version: str) -> str:
+    # Hash the decoded pixels rather than the file bytes, so the same logo/table
+    # re-encoded by a different PDF writer still maps to the same entry
+    digest = hashlib.sha256(prompt_version.encode("utf-8"))
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img = img.convert("RGB")
+            digest.update(f"{img.size[0]}x{img.size[1]}".encode("ascii"))
+            digest.update(img.tobytes())
+    except Exception:
+        digest.update(image_bytes)
+    return digest.hexdigest()
+
+class VisionCache:
+    """Persistent (SQLite) cache of vision-model Markdown keyed by image_key().
+
+    Size-bounded: once the stored Markdown exceeds `max_bytes`, the least recently
+    used entries are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS vision_cache (
+                key TEXT PRIMARY KEY,
+                markdown TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS vision_cache_last_used ON vision_cache (last_used)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT markdown FROM vision_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE vision_cache SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, markdown: str):
+        now = time.time()
+        size = len(markdown.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO vision_cache (key, markdown, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, markdown, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM vision_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM vision_cache ORDER BY last_used ASC").fetchall():
+            self._conn.execute("DELETE FROM vision_cache WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM vision_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
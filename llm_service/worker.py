@@ -0,0 +1,27 @@
+import asyncio
+
+from metrics import serve_metrics
+
+# Standalone ingestion worker: runs document analysis jobs from the shared queue
+# outside the API process, so it can be scaled separately from chat traffic. It also
+# runs the orphan sweeper (every SWEEP_INTERVAL_SECONDS, 0 disables).
+#
+# Usage: python worker.py   (concurrency from INGESTION_WORKER_CONCURRENCY,
+#                            Prometheus metrics on WORKER_METRICS_PORT)
+
+async def main():
+    # Imported here, not at module level: PDF extraction uses a "spawn" process pool,
+    # which re-imports this script in every child; the children must not rebuild the
+    # app (Supabase/Pinecone clients, stores, models)
+    from main import start_ingestion_workers, run_sweeper, INGESTION_WORKER_CONCURRENCY, WORKER_METRICS_PORT, SWEEP_INTERVAL_SECONDS
+
+    tasks = [
+        start_ingestion_workers(INGESTION_WORKER_CONCURRENCY),
+        serve_metrics(WORKER_METRICS_PORT)
+    ]
+    if SWEEP_INTERVAL_SECONDS > 0:
+        tasks.append(run_sweeper())
+    await asyncio.gather(*tasks)
+
+if __name__ == "__main__":
+    asyncio.run(main())